@@ -13,7 +13,40 @@ USER_IDS = ("370964201478553600", "581141017823019038", "442713612822380554", "2
             # URL                 # Diatom              # Cirro               # Galoomba
 
 # General config.
-fileCount = 0
+GZIP_THRESHOLD = 2**20 # Text files larger than this many bytes are sent compressed.
+
+# Worker processes for heavy calculations.
+POOL_SIZE = 2 # Number of worker processes.
+QUEUE_DEPTH = 8 # Number of calculations that may wait for a free worker.
+TIMEOUT = 10 # Seconds after which a calculation is killed.
+
+# Polytope Wiki.
+WIKI_URL = "https://polytope.miraheze.org" # Base URL of the wiki, whose API is at /w/api.php.
+WIKI_CONNECTIONS = 4 # Maximum number of requests sent to the wiki at once.
+WIKI_TIMEOUT = 10 # Seconds after which a request to the wiki is given up.
+
+# Maximum number of digits for ?circumradius digits.
+MAX_DIGITS = 1000
+
+# Maximum number of nodes for ?family, which lists 2ⁿ - 1 circumradii.
+MAX_FAMILY_NODES = 10
+
+# Diagram rendering.
+RENDER_SCALE = 0.8 # Size of the images, relative to the layout.
+RENDER_SUPERSAMPLE = 1 # Draws this many times larger and shrinks down, for smoother but slower images.
+PNG_PRESET = 'balanced' # One of 'lossless', 'fast', 'balanced' or 'small'. See draw.py.
+RENDER_VECTOR = False # Rasterizes the SVG drawing with cairosvg instead of drawing with Pillow.
+MAX_PIXELS = 4 * 10**6 # Larger diagrams are laid out more compactly, or drawn smaller.
+MAX_DIAGRAMS = 16 # Maximum number of diagrams ?cd draws at once.
+RENDER_THREADS = 4 # Threads that draw diagrams.
+
+# Cache of rendered diagrams.
+RENDER_CACHE_BYTES = 32 * 2**20 # Maximum size of the images kept in memory.
+RENDER_CACHE_DIR = None # Directory in which to also keep them, if any.
+
+# Cache of circumradii and spaces, by diagram up to isomorphism.
+RESULT_CACHE_SIZE = 4096
+RESULT_STORE = "results.sqlite3" # Database in which to also keep them, if any.
 
 # Create log folder.
 try:
@@ -5,22 +5,45 @@ from discord.ext import commands
 from discord.embeds import Embed
 
 import traceback
-from func_timeout import func_timeout, FunctionTimedOut
 
-from requests.exceptions import ReadTimeout
-import os
+import io
+import gzip
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import src.py.wiki as Wiki
 from src.py.cd import CD
-from src.py.exceptions import CDError, TemplateError
+from src.py.exceptions import CDError, TemplateError, CalculationTimeout, PoolFull, WikiError
 from src.py.draw import Draw
 from src.py.node import Graph
 import src.py.explanation as explanation
-from mwclient.errors import MwClientError
+import src.py.compute as Compute
+from src.py.cache import RenderCache, ResultCache, InFlight
+from src.py.store import ResultStore
 
 # Configures the bot.
 client = commands.Bot(command_prefix = PREFIX)
 
+# Starts the worker processes, before any other threads exist.
+pool = Compute.Pool(POOL_SIZE, QUEUE_DEPTH, TIMEOUT)
+a_logger.info(f"INFO: Started {POOL_SIZE} worker processes.")
+
+# Rendered diagrams, by graph key.
+renderCache = RenderCache(RENDER_CACHE_BYTES, RENDER_CACHE_DIR)
+
+# Results of calculations, by canonical key.
+# Rendered diagrams can't be cached this way, since isomorphic diagrams may be drawn differently.
+resultCache = ResultCache(RESULT_CACHE_SIZE)
+resultStore = None if RESULT_STORE is None else ResultStore(RESULT_STORE, Compute.ENGINE_VERSION)
+
+# Requests that are being processed, so that duplicates can share their results.
+inFlight = InFlight()
+
+# Threads that draw diagrams, so that the event loop isn't blocked.
+# Pillow releases the GIL for most of the work.
+renderPool = ThreadPoolExecutor(RENDER_THREADS)
+
 # Runs on client ready.
 @client.event
 async def on_ready() -> None:
@@ -92,6 +115,18 @@ async def help(ctx, *args: str) -> None:
             inline = False
         )
 
+        helpEmbed.add_field(
+            name = f"`{PREFIX}circumradius [linearized diagram]`",
+            value = explanation.circumradius,
+            inline = False
+        )
+
+        helpEmbed.add_field(
+            name = f"`{PREFIX}family [linearized diagram]`",
+            value = explanation.family,
+            inline = False
+        )
+
         await ctx.send(embed = helpEmbed)
     # The ?help help embed.
     elif command == 'help':
@@ -112,7 +147,9 @@ async def help(ctx, *args: str) -> None:
                 f"`{PREFIX}cd x3o3o`: A simple diagram.\n"
                 f"`{PREFIX}cd s3s4o3x`: A diagram with various node types.\n"
                 f"`{PREFIX}cd x3x3x3*a`: A diagram with loops.\n"
-                f"`{PREFIX}cd *-c3x3x3x o3o3o3o3o`: A branching diagram."
+                f"`{PREFIX}cd *-c3x3x3x o3o3o3o3o`: A branching diagram.\n"
+                f"`{PREFIX}cd svg x4o3o`: A diagram as an SVG file.\n"
+                f"`{PREFIX}cd x3o3o, o3x3o, x3x3o`: Several diagrams at once."
             )
         ))
     # The ?help wiki embed.
@@ -167,6 +204,27 @@ async def help(ctx, *args: str) -> None:
                 f"`{PREFIX}space x∞o6o`: Returns the dimension and curvature of an order 6 apierogonal tiling."
             )
         ))
+    # The ?help circumradius embed.
+    elif command in ('circumradius', 'radius', 'cr'):
+        await ctx.send(embed = commandHelpEmbed(
+            command = command,
+            shortExplanation = explanation.circumradius,
+            examples = (
+                f"`{PREFIX}cr x4o3o`: Returns the circumradius of a cube as a decimal.\n"
+                f"`{PREFIX}cr exact x3o5o`: Returns the exact circumradius of an icosahedron.\n"
+                f"`{PREFIX}cr digits 50 x3o3o5o`: Returns the circumradius of a hexacosichoron to 50 digits."
+            )
+        ))
+    # The ?help family embed.
+    elif command == 'family':
+        await ctx.send(embed = commandHelpEmbed(
+            command = command,
+            shortExplanation = explanation.family,
+            examples = (
+                f"`{PREFIX}family o4o3o`: Returns the circumradii of the 7 cube family members as decimals.\n"
+                f"`{PREFIX}family exact o3o3o5o`: Returns the exact circumradii of the 15 hecatonicosachoron family members."
+            )
+        ))
     else:
         await ctx.send(f"Command `{command}` not recognized.")
 
@@ -183,24 +241,31 @@ async def cd(ctx, *args: str) -> None:
             await ctx.send(":cd: :play_pause:")
         elif cd == "c":
             await ctx.send("https://cdc.gov")
-        else:
+        # Sends the diagram as an SVG file, which is cheap enough not to cache.
+        elif args[0] == 'svg':
+            if len(args) == 1:
+                await ctx.send(f"Usage: `{PREFIX}cd svg x4o3o`. Run `{PREFIX}help cd` for details.")
+                return
+
             try:
-                graph = CD(cd).toGraph()
-                temp = Draw(graph).toImage()
-            except CDError as e:
+                graph = await pool.run(Compute.parse, ' '.join(args[1:]))
+            except (CDError, CalculationTimeout, PoolFull) as e:
                 await error(ctx, str(e), dev = False)
                 return
 
-            global fileCount
-            fileName = f"temp{fileCount}.png"
-            fileCount += 1
-
-            temp.save(fileName)
-            log(ctx, f"INFO: Created {fileName} file.")
-            await ctx.send(file = discord.File(fileName))
+            svg = (await render(drawSVG, graph)).encode('utf-8')
+            await ctx.send(file = attachment(svg, "cd.svg"))
+            log(ctx, f"INFO: Sent {len(svg)} byte SVG.")
+        else:
+            # Identical requests that arrive together share a single drawing.
+            try:
+                png = await inFlight.run(f"cd {cd}", drawDiagrams, cd)
+            except (CDError, CalculationTimeout, PoolFull) as e:
+                await error(ctx, str(e), dev = False)
+                return
 
-            os.remove(fileName)
-            log(ctx, f"INFO: Removed {fileName} file.")
+            await ctx.send(file = attachment(png, "cd.png"))
+            log(ctx, f"INFO: Sent {len(png)} byte image.")
 
     # Unexpected error.
     except Exception as e:
@@ -209,21 +274,76 @@ async def cd(ctx, *args: str) -> None:
 @client.command(aliases = ["radius", "cr"])
 async def circumradius(ctx, *args: str) -> None:
     try:
+        log(ctx, f"COMMAND: circumradius {' '.join(args)}")
+        exact = False
+        digits = None
+
+        # Reads the mode, if any.
+        if len(args) > 0 and args[0] == 'exact':
+            exact = True
+            args = args[1:]
+        elif len(args) > 1 and args[0] == 'digits':
+            if not args[1].isdigit() or not 0 < int(args[1]) <= MAX_DIGITS:
+                await error(ctx, f"The number of digits must be between 1 and {MAX_DIGITS}.", dev = False)
+                return
+
+            digits = int(args[1])
+            args = args[2:]
+
         cd = ' '.join(args)
-        log(ctx, f"COMMAND: circumradius {cd}")
-        mode = 'plain'
+        if cd == '':
+            await ctx.send(f"Usage: `{PREFIX}circumradius x4o3o`. Run `{PREFIX}help circumradius` for details.")
+            return
 
         # Posts circumradius
         try:
-            circ = func_timeout(10, lambda x: CD(x).toGraph().circumradius(), args = (cd,))
-        except CDError as e:
+            if exact:
+                circ = await inFlight.run(f"cr exact {cd}", calculate, "cr exact", Compute.circumradius, cd)
+            else:
+                circ = await inFlight.run(f"cr {digits} {cd}", calculate, f"cr {digits}", Compute.circumradiusNumeric, cd, digits)
+        except (CDError, CalculationTimeout, PoolFull) as e:
             await error(ctx, str(e), dev = False)
             return
-        except FunctionTimedOut as e:
-            await error(ctx, "Calculation timed out after 10s.", dev = False)
+
+        if exact:
+            await longSend(ctx, f"**Circumradius**: {Graph.format(circ, 'plain')}\n**Decimal approximation:** {Graph.format(circ.evalf(), 'plain')}")
+        else:
+            await longSend(ctx, f"**Circumradius** ≈ {Graph.format(circ, 'plain')}")
+    # Unexpected error.
+    except Exception as e:
+        await error(ctx, str(e), dev = True)
+
+# Lists the circumradii of every ringing of a CD.
+@client.command()
+async def family(ctx, *args: str) -> None:
+    try:
+        log(ctx, f"COMMAND: family {' '.join(args)}")
+
+        # Reads the mode, if any.
+        exact = len(args) > 0 and args[0] == 'exact'
+        if exact:
+            args = args[1:]
+
+        cd = ' '.join(args)
+        if cd == '':
+            await ctx.send(f"Usage: `{PREFIX}family o4o3o`. Run `{PREFIX}help family` for details.")
             return
 
-        await longSend(ctx, f"**Circumradius**: {Graph.format(circ, mode)}\n**Decimal approximation:** {Graph.format(circ.evalf(), 'plain')}")
+        try:
+            members = await inFlight.run(f"family {exact} {cd}", pool.run, Compute.family, cd, exact, MAX_FAMILY_NODES)
+        except (CDError, CalculationTimeout, PoolFull) as e:
+            await error(ctx, str(e), dev = False)
+            return
+
+        # Posts a line per ringing.
+        lines = [f"**Circumradii of the {len(members)} ringings of {cd}:**"]
+        for diagram, circ, decimal in members:
+            if exact:
+                lines.append(f"`{diagram}`: {Graph.format(circ, 'plain')} ≈ {Graph.format(decimal, 'plain')}")
+            else:
+                lines.append(f"`{diagram}`: {Graph.format(circ, 'plain')}")
+
+        await longSend(ctx, '\n'.join(lines))
     # Unexpected error.
     except Exception as e:
         await error(ctx, str(e), dev = True)
@@ -239,15 +359,11 @@ async def space(ctx, *args: str) -> None:
             await ctx.send(f"Usage: `{PREFIX}space x4o3o`. Run `{PREFIX}help space` for details.")
         else:
             try:
-                graph = CD(cd).toGraph()
-                space = func_timeout(10, lambda x: graph.spaceOf(), args = (cd,))
+                space = await calculate("space", Compute.space, cd)
                 await ctx.send(cd+space)
-            except CDError as e:
+            except (CDError, CalculationTimeout, PoolFull) as e:
                 await error(ctx, str(e), dev = False)
                 return
-            except FunctionTimedOut as e:
-                await error(ctx, "Calculation timed out after 10s.", dev = False)
-                return
 
     # Unexpected error.
     except Exception as e:
@@ -269,10 +385,10 @@ async def wiki(ctx, *args: str) -> None:
 
         # Tries to load the page.
         try:
-            page = Wiki.page(title, redirect = True)
+            page = await Wiki.page(title, redirect = True)
 
         # Any of the possible errors when reading a page.
-        except (MwClientError, ReadTimeout) as e:
+        except WikiError as e:
             await error(ctx, str(e), dev = False)
             return
 
@@ -315,14 +431,14 @@ async def redirect(ctx, *args: str):
 
         # Tries to load the pages.
         try:
-            originPage = Wiki.page(args[0])
+            originPage = await Wiki.page(args[0])
             originTitle = originPage.name
-            redirectPage = Wiki.page(args[1])
+            redirectPage = await Wiki.page(args[1])
             redirectTitle = redirectPage.name
-            redirectPage = Wiki.page(args[1], redirect = True)
+            redirectPage = await Wiki.resolveRedirect(redirectPage)
 
         # Any of the possible errors when reading a page.
-        except (MwClientError, ReadTimeout) as e:
+        except WikiError as e:
             await error(ctx, str(e), dev = False)
             return
 
@@ -361,7 +477,7 @@ async def redirect(ctx, *args: str):
 
         # Creates the redirect if the user says yes.
         if msg.content.lower() == 'confirm':
-            Wiki.redirect(originPage, redirectPage)
+            await Wiki.redirect(originPage, redirectPage)
             await ctx.send(f"Redirected {Wiki.titleToURL(originTitle)} to {Wiki.titleToURL(redirectNewTitle)}.")
         else:
             await ctx.send("Redirect cancelled.")
@@ -383,7 +499,7 @@ async def search(ctx, *args: str) -> None:
             title = f"Search Results for: {key}"
         )
 
-        for result in Wiki.search(key):
+        for result in await Wiki.search(key):
             resultNumber += 1
             title = result.get('title')
             embed.add_field(
@@ -424,11 +540,11 @@ async def get(ctx, *args: str) -> None:
         field, title = args[0], args[1]
 
         try:
-            page = Wiki.page(title, redirect = True)
-            fieldName, value = Wiki.getField(page, field)
+            page = await Wiki.page(title, redirect = True)
+            fieldName, value = await Wiki.getField(page, field)
 
         # Any of the possible errors when reading a template.
-        except (MwClientError, ReadTimeout, TemplateError) as e:
+        except (WikiError, TemplateError) as e:
             await error(ctx, str(e), dev = False)
             return
 
@@ -461,12 +577,12 @@ async def info(ctx, *args: str) -> None:
             return
 
         # Tries to get the item info.
+        # Identical requests share a single query.
         try:
-            page = Wiki.page(title, redirect = True)
-            fieldList = Wiki.getFields(page)
+            page, fieldList = await inFlight.run(f"info {Wiki.normalize(title)}", fetchInfo, title)
 
         # Title contains non-standard characters.
-        except (MwClientError, TemplateError) as e:
+        except (WikiError, TemplateError) as e:
             await error(ctx, str(e), dev = False)
             return
         
@@ -489,6 +605,17 @@ async def info(ctx, *args: str) -> None:
     except Exception as e:
         await error(ctx, str(e), dev = True)
 
+# Dev command, shows the usage of the render cache.
+@client.command()
+async def stats(ctx) -> None:
+    log(ctx, f"COMMAND: stats")
+    await ctx.send(
+        f"Render cache: {renderCache.stats()}\n"
+        f"Result cache: {resultCache.stats()}\n"
+        f"Result store: {'disabled' if resultStore is None else await render(resultStore.count)} results\n"
+        f"Shared requests: {inFlight.shared}"
+    )
+
 # Dev command, shows the client latency.
 @client.command(aliases = [":ping_pong:", "🏓"])
 async def ping(ctx) -> None:
@@ -549,20 +676,95 @@ async def error(ctx, text: str, dev: bool = False) -> None:
     await ctx.send(msg)
 
 # Sends a message, posting it as a text file in case it is too long.
+# Very long texts are compressed.
 async def longSend(ctx, text: str):
     if len(text) <= 2000:
         await ctx.send(text)
     else:
-        global fileCount
-        fc = fileCount
-        fileCount += 1
+        data = text.encode('utf-8')
+
+        if len(data) <= GZIP_THRESHOLD:
+            await ctx.send("Result too long, posted as a text file:", file = attachment(data, "result.txt"))
+        else:
+            await ctx.send("Result too long, posted as a compressed text file:", file = attachment(gzip.compress(data), "result.txt.gz"))
+
+# Draws a diagram, or several comma-separated ones in a grid, as a PNG file.
+async def drawDiagrams(cd: str) -> bytes:
+    # Draws several diagrams in a grid.
+    if ',' in cd:
+        cds = [diagram.strip() for diagram in cd.split(',')]
+
+        if len(cds) > MAX_DIAGRAMS:
+            raise CDError(f"At most {MAX_DIAGRAMS} diagrams can be drawn at once.")
+
+        graphs = await pool.run(Compute.parseAll, cds)
+        key = '\n'.join(f"{diagram}\t{graph.key()}" for diagram, graph in zip(cds, graphs))
+
+        png = await renderCache.get(key)
+        if png is None:
+            # Draws the diagrams concurrently, sharing the pixel budget.
+            images = await asyncio.gather(*(
+                render(drawImage, graph, MAX_PIXELS // len(graphs)) for graph in graphs
+            ))
+            grid = await render(Draw.grid, images, cds, RENDER_SCALE)
+            png = await render(Draw.encode, grid, PNG_PRESET)
+            await renderCache.put(key, png)
+    else:
+        graph = await pool.run(Compute.parse, cd)
+        key = graph.key()
+
+        # Only draws diagrams that aren't cached.
+        png = await renderCache.get(key)
+        if png is None:
+            image = await render(drawImage, graph, MAX_PIXELS)
+            png = await render(Draw.encode, image, PNG_PRESET)
+            await renderCache.put(key, png)
+
+    return png
+
+# Runs a calculation on a diagram in the pool, unless it's cached in memory or stored on disk.
+# Results are cached by the diagram's canonical key, so isomorphic diagrams share them.
+# The key is also worked out in the pool, as huge diagrams may take long enough that it has to be killable.
+async def calculate(kind: str, func, cd: str, *args):
+    key = await pool.run(Compute.canonicalKey, cd)
+
+    result = resultCache.get(f"{kind} {key}")
+    if result is not None:
+        return result
+
+    if resultStore is not None:
+        result = await resultStore.get(key, kind)
+
+    if result is None:
+        start = time.perf_counter()
+        result = await pool.run(func, cd, *args)
+
+        if resultStore is not None:
+            resultStore.put(key, kind, result, time.perf_counter() - start)
+
+    resultCache.put(f"{kind} {key}", result)
+    return result
+
+# Gets a wiki page and the fields of its infobox.
+async def fetchInfo(title: str):
+    page = await Wiki.page(title, redirect = True)
+    return page, await Wiki.getFields(page)
+
+# Runs a drawing function in the render threads.
+async def render(func, *args):
+    return await asyncio.get_event_loop().run_in_executor(renderPool, func, *args)
+
+# Draws a diagram with the configured settings.
+def drawImage(graph: Graph, maxPixels: int):
+    return Draw(graph, RENDER_SCALE, RENDER_SUPERSAMPLE, maxPixels).toRaster(RENDER_VECTOR)
 
-        with open(f"result{fc}.txt", "w") as fileW:
-            fileW.write(text)
+# Draws a diagram as an SVG file.
+def drawSVG(graph: Graph) -> str:
+    return Draw(graph, RENDER_SCALE).toSVG()
 
-        with open(f"result{fc}.txt", "rb") as fileR:
-            await ctx.send("Result too long, posted as a text file:", file = discord.File(fileR, "result.txt"))
-            os.remove(f"result{fc}.txt")
+# Wraps some data as a file to upload, without touching the disk.
+def attachment(data: bytes, fileName: str) -> discord.File:
+    return discord.File(io.BytesIO(data), fileName)
 
 def log(ctx, text: str) -> None:
     a_logger.info(f'<@{ctx.message.author.id}> {text}')
@@ -579,9 +781,9 @@ def commandHelpEmbed(command: str, shortExplanation: str, examples: str) -> Embe
 
     return embed
 
-# Logs into the wiki.
+# Logs into the wiki, in the event loop the bot will run in.
 a_logger.info("INFO: Logging into the wiki...")
-Wiki.login()
+client.loop.run_until_complete(Wiki.login(WIKI_URL, WIKI_CONNECTIONS, WIKI_TIMEOUT))
 a_logger.info("INFO: Succesfully logged in.")
 
 # Runs the bot.
@@ -0,0 +1,168 @@
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# A least-recently-used cache of encoded images, bounded by their total size in bytes.
+# Optionally mirrors its entries to a directory, so that they survive restarts.
+# The entries in memory are only touched from the event loop.
+class RenderCache:
+    # Class constructor.
+    def __init__(self, maxBytes: int, directory: Optional[str] = None) -> None:
+        self.maxBytes = maxBytes
+        self.directory = directory
+
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes: int = 0
+
+        # Counters, to see how well the cache is sized.
+        self.hits: int = 0
+        self.diskHits: int = 0
+        self.misses: int = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # Gets the data stored for a key, or None if there's none.
+    # The disk is read in an executor thread, so the event loop never waits on it.
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self.entries.get(key)
+
+        if data is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+        # Tries the disk.
+        if self.directory is not None:
+            data = await asyncio.get_event_loop().run_in_executor(None, self.read, key)
+
+            if data is not None:
+                self.diskHits += 1
+                self.__store(key, data)
+                return data
+
+        self.misses += 1
+        return None
+
+    # Stores the data for a key.
+    async def put(self, key: str, data: bytes) -> None:
+        self.__store(key, data)
+
+        if self.directory is not None:
+            await asyncio.get_event_loop().run_in_executor(None, self.write, key, data)
+
+    # Reads the data for a key from the disk, or None if there's none. Blocking.
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    # Writes the data for a key to the disk. Blocking.
+    # Writes to a temporary file first, so that no half-written file is ever read.
+    def write(self, key: str, data: bytes) -> None:
+        path = self.path(key)
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+
+    # Stores the data in memory, evicting the least recently used entries if needed.
+    def __store(self, key: str, data: bytes) -> None:
+        if len(data) > self.maxBytes:
+            return
+
+        if key in self.entries:
+            self.bytes -= len(self.entries.pop(key))
+
+        self.entries[key] = data
+        self.bytes += len(data)
+
+        while self.bytes > self.maxBytes:
+            _, evicted = self.entries.popitem(last = False)
+            self.bytes -= len(evicted)
+
+    # Gets the file in which the data for a key is stored.
+    def path(self, key: str) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + ".png")
+
+    # Summarizes the cache's usage.
+    def stats(self) -> str:
+        return (
+            f"{self.hits} hits, {self.diskHits} disk hits, {self.misses} misses. "
+            f"{len(self)} entries, {self.bytes / 2**10:.0f} of {self.maxBytes / 2**10:.0f} KiB used."
+        )
+
+# A least-recently-used cache of calculation results, bounded by their number.
+# Can be shared between threads.
+class ResultCache:
+    # Class constructor.
+    def __init__(self, maxEntries: int) -> None:
+        self.maxEntries = maxEntries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # Gets the result stored for a key, or None if there's none.
+    def get(self, key: str) -> Any:
+        with self.lock:
+            result = self.entries.get(key)
+
+            if result is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+            return result
+
+    # Stores the result for a key, evicting the least recently used one if needed.
+    def put(self, key: str, result: Any) -> None:
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+
+            if len(self.entries) > self.maxEntries:
+                self.entries.popitem(last = False)
+
+    # Summarizes the cache's usage.
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses. {len(self)} of {self.maxEntries} entries used."
+
+# Coalesces identical requests that run at the same time:
+# while a request with some key is running, others with the same key wait for its result.
+class InFlight:
+    # Class constructor.
+    def __init__(self) -> None:
+        self.futures: Dict[str, asyncio.Future] = {}
+
+        # Number of requests that got the result of another.
+        self.shared: int = 0
+
+    # Runs func(*args), unless a request with the same key is already running,
+    # in which case it returns its result (or raises its exception) instead.
+    async def run(self, key: str, func: Callable[..., Awaitable], *args: Any) -> Any:
+        future = self.futures.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(func(*args))
+            self.futures[key] = future
+            future.add_done_callback(lambda _: self.futures.pop(key, None))
+        else:
+            self.shared += 1
+
+        # A cancelled request doesn't cancel the others waiting on it.
+        return await asyncio.shield(future)
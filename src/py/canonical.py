@@ -0,0 +1,235 @@
+import hashlib
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Maximum number of candidate orderings tried for a component that isn't a tree.
+# Past this, the best ordering found so far is used. Keys stay exact, but two spellings
+# of a very symmetric diagram might then get different ones.
+MAX_LEAVES = 256
+
+# Gets a string identifying a graph, with its nodes in the given order.
+# Different spellings of the same diagram, like x3o3o3*a and x-3-o-3-o-3-*-c, give the same key.
+# If values is False, node values are ignored, so that only the topology of the graph is identified.
+def keyOf(nodes: List[Any], values: bool = True) -> str:
+    index = {node: i for i, node in enumerate(nodes)}
+    edges: List[str] = []
+
+    for node in nodes:
+        for neighbor, label in zip(node.neighbors, node.edgeLabels):
+            if index[node] < index[neighbor]:
+                edges.append(f"{index[node]}-{index[neighbor]}:{label}")
+
+    return ' '.join(valueOf(node, values) for node in nodes) + ' | ' + ' '.join(sorted(edges))
+
+# Gets the nodes of a graph in canonical order.
+# Isomorphic diagrams, like x3o3o and o3o3x, get the same key when their nodes are in this order.
+# Components are ordered by their own keys. If values is False, node values are ignored.
+def order(nodes: List[Any], values: bool = True) -> List[Any]:
+    components: List[Tuple[str, List[Any]]] = []
+    seen = set()
+
+    for node in nodes:
+        if node in seen:
+            continue
+
+        # Gets the node's component.
+        component = [node]
+        seen.add(node)
+        for v in component:
+            for neighbor in v.neighbors:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    component.append(neighbor)
+
+        edges = sum(len(v.neighbors) for v in component) // 2
+        if edges == len(component) - 1:
+            componentOrder = treeOrder(component, values)
+        else:
+            componentOrder = searchOrder(component, values)
+
+        components.append((keyOf(componentOrder, values), componentOrder))
+
+    components.sort(key = lambda component: component[0])
+    return [node for _, componentOrder in components for node in componentOrder]
+
+# Gets the SHA-256 hash of the canonical key of a graph.
+def hashOf(nodes: List[Any]) -> str:
+    return hashlib.sha256(keyOf(order(nodes)).encode('utf-8')).hexdigest()
+
+# Orders a tree canonically, by rooting it at its center and sorting its branches
+# by their encodings (the AHU algorithm).
+def treeOrder(tree: List[Any], values: bool = True) -> List[Any]:
+    # Finds the center, or the two centers, by removing leaves until at most two nodes are left.
+    degrees = {node: len(node.neighbors) for node in tree}
+    leaves = [node for node in tree if degrees[node] <= 1]
+    remaining = len(tree)
+
+    while remaining > 2:
+        newLeaves = []
+        for leaf in leaves:
+            remaining -= 1
+            for neighbor in leaf.neighbors:
+                degrees[neighbor] -= 1
+                if degrees[neighbor] == 1:
+                    newLeaves.append(neighbor)
+
+        leaves = newLeaves
+
+    # Roots the tree at whichever center gives the least encoding.
+    best: Optional[Tuple[str, List[Any]]] = None
+    for center in leaves:
+        encoding, centerOrder = rootedOrder(center, values)
+        if best is None or encoding < best[0]:
+            best = (encoding, centerOrder)
+
+    assert best is not None
+    return best[1]
+
+# Encodes a tree rooted at some node, and gets its nodes in preorder, with branches sorted by their encodings.
+# Edge labels and node values can't contain brackets, commas or colons, so the encoding is unambiguous.
+def rootedOrder(root: Any, values: bool = True) -> Tuple[str, List[Any]]:
+    bfs = [root]
+    parents: Dict[Any, Any] = {root: None}
+    for node in bfs:
+        for neighbor in node.neighbors:
+            if neighbor is not parents[node]:
+                parents[neighbor] = node
+                bfs.append(neighbor)
+
+    # Encodes every branch, leaves first.
+    branches: Dict[Any, List[Tuple[str, Any]]] = {node: [] for node in bfs}
+    codes: Dict[Any, str] = {}
+
+    for node in reversed(bfs):
+        branches[node].sort(key = lambda branch: branch[0])
+        codes[node] = f"{valueOf(node, values)}[{','.join(code for code, _ in branches[node])}]"
+
+        parent = parents[node]
+        if parent is not None:
+            label = node.edgeLabels[node.neighbors.index(parent)]
+            branches[parent].append((f"{label}:{codes[node]}", node))
+
+    # Walks through the branches in order.
+    res = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        res.append(node)
+        stack.extend(child for _, child in reversed(branches[node]))
+
+    return codes[root], res
+
+# Orders a graph canonically, by refining a coloring of its nodes, and then individualizing
+# the nodes of the first color with more than one node, one at a time.
+# Of all the orderings reached this way, the one with the least key is taken.
+#
+# Orderings with the same key as the first one reveal symmetries of the graph, so the
+# first individualized node is skipped if a symmetry maps it to one that was already tried.
+# This keeps loops and other symmetric diagrams cheap.
+def searchOrder(graph: List[Any], values: bool = True) -> List[Any]:
+    n = len(graph)
+    index = {node: i for i, node in enumerate(graph)}
+    adjacency = [
+        [(index[neighbor], label) for neighbor, label in zip(node.neighbors, node.edgeLabels)]
+        for node in graph
+    ]
+
+    # Nodes start out colored by their values.
+    colors = sorted(set(valueOf(node, values) for node in graph))
+    root = refine([colors.index(valueOf(node, values)) for node in graph], adjacency)
+
+    # Orbits of the symmetries found so far, as a union-find forest.
+    orbits = list(range(n))
+
+    def find(v: int) -> int:
+        while orbits[v] != v:
+            orbits[v] = orbits[orbits[v]]
+            v = orbits[v]
+
+        return v
+
+    best: Optional[Tuple[str, List[int]]] = None
+    first: Optional[Tuple[str, List[int]]] = None
+    leaves = 0
+    tried: List[int] = []
+
+    for start in firstCell(root) or [None]:
+        if leaves >= MAX_LEAVES:
+            break
+
+        if start is not None:
+            if any(find(v) == find(start) for v in tried):
+                continue
+
+            tried.append(start)
+            stack = [individualize(root, start, adjacency)]
+        else:
+            stack = [root]
+
+        while stack and leaves < MAX_LEAVES:
+            colors = stack.pop()
+            cell = firstCell(colors)
+
+            if cell:
+                for v in reversed(cell):
+                    stack.append(individualize(colors, v, adjacency))
+
+                continue
+
+            # Every node has its own color, so they're ordered.
+            candidate = sorted(range(n), key = colors.__getitem__)
+            key = keyOf([graph[v] for v in candidate], values)
+            leaves += 1
+
+            if best is None or key < best[0]:
+                best = (key, candidate)
+
+            # Records the symmetry mapping the first ordering to this one.
+            if first is None:
+                first = (key, candidate)
+            elif key == first[0]:
+                for u, v in zip(first[1], candidate):
+                    orbits[find(u)] = find(v)
+
+    assert best is not None
+    return [graph[v] for v in best[1]]
+
+# Gets the value of a node, or a placeholder if values are ignored.
+def valueOf(node: Any, values: bool) -> str:
+    return node.value if values else 'o'
+
+# Gets the nodes of the first color that's shared by more than one node.
+def firstCell(colors: List[int]) -> List[int]:
+    counts: Dict[int, int] = {}
+    for color in colors:
+        counts[color] = counts.get(color, 0) + 1
+
+    cells = [color for color, count in counts.items() if count > 1]
+    if not cells:
+        return []
+
+    cell = min(cells)
+    return [v for v in range(len(colors)) if colors[v] == cell]
+
+# Gives a node a color of its own, right before the rest of its color, and refines the coloring.
+def individualize(colors: List[int], v: int, adjacency: List[List[Tuple[int, str]]]) -> List[int]:
+    cell = colors[v]
+    return refine([2 * color + (color == cell and u != v) for u, color in enumerate(colors)], adjacency)
+
+# Refines a coloring, until nodes of the same color have as many neighbors of each color
+# through edges of each label. Colors are numbered canonically, and cells are only ever split.
+def refine(colors: List[int], adjacency: List[List[Tuple[int, str]]]) -> List[int]:
+    count = -1
+
+    while True:
+        signatures = [
+            (colors[v], tuple(sorted((label, colors[u]) for u, label in adjacency[v])))
+            for v in range(len(colors))
+        ]
+        ranks = {signature: i for i, signature in enumerate(sorted(set(signatures)))}
+        colors = [ranks[signature] for signature in signatures]
+
+        if len(ranks) == count:
+            return colors
+
+        count = len(ranks)
@@ -1,10 +1,10 @@
 import re
-from src.py.node import Node, Graph
+from src.py.node import Graph
 from src.py.exceptions import CDError
 
-from typing import List, NoReturn, Optional
+from typing import Iterator, List, NoReturn, Optional, Pattern, Set, Tuple
 
-MAX_LEN = 100 # Hardcoded node limit.
+MAX_LEN = 1000 # Hardcoded node limit. Larger diagrams are bounded by the calculation timeout and the pixel budget.
 
 # Stores the index of a node, and its position in the string.
 class NodeRef:
@@ -24,6 +24,15 @@ class EdgeRef:
             return self.index0
         return self.index1
 
+# Stores a single token read from the diagram string.
+class Token:
+    def __init__(self, kind: str, label: str, start: int, end: int, nodeIndex: Optional[int] = None) -> None:
+        self.kind: str = kind # One of 'node', 'edge', 'virtual' or 'space'.
+        self.label: str = label # The token's text, without enclosing parentheses.
+        self.start: int = start # The position of the token's first character.
+        self.end: int = end # The position of the token's last character.
+        self.nodeIndex: Optional[int] = nodeIndex # The node a virtual node refers to.
+
 # Various regexes:
 numberRegex = "([0-9]*)"
 fractionRegex = f"({numberRegex}\/{numberRegex})"
@@ -49,6 +58,12 @@ edgeLabels = f"({edgeLabels_})|\(({edgeLabels_})\)"
 virtualNodesLetter = "\*-?[a-z]"
 virtualNodesNumber = f"\*-?[1-9]|\*\(-?{numberRegex}\)"
 
+# The regexes above, compiled once so that they can be matched in place.
+nodeLabelsRegex = re.compile(nodeLabels)
+edgeLabelsRegex = re.compile(edgeLabels)
+virtualNodesLetterRegex = re.compile(virtualNodesLetter)
+virtualNodesNumberRegex = re.compile(virtualNodesNumber)
+
 # Represents a Coxeter Diagram, and contains the necessary methods to parse it.
 class CD:
     # Class initializer.
@@ -57,60 +72,49 @@ class CD:
         self.index: int = 0
         self.string: str = string
 
-    # Tries to match a regex at certain point in the string.
-    def matchRegex(self, regex: str) -> Optional[str]:
-        match = re.search(regex, self.string[self.index:])
+    # Tries to match a regex at the current point in the string.
+    # The match is anchored, so this takes time proportional to the match's length.
+    def matchRegex(self, regex: Pattern) -> Optional[str]:
+        match = regex.match(self.string, self.index)
         if match is None:
             return None
 
-        span = match.span()
-
-        if span[0] != 0:
-            return None
-
-        self.index += span[1] - span[0] - 1
-
+        self.index = match.end() - 1
         return match.group()
 
     def readNode(self) -> str:
-        return self.matchRegex(nodeLabels) or ""
+        return self.matchRegex(nodeLabelsRegex) or ""
 
     # Reads a number from a given position.
     def readNumber(self) -> str:
-        return self.matchRegex(edgeLabels) or ""
+        return self.matchRegex(edgeLabelsRegex) or ""
 
     # Reads a virtual node from a given position.
     def readVirtualNode(self, nodeType: str) -> Optional[str]:
         if nodeType == 'letter':
-            return self.matchRegex(virtualNodesLetter)
+            return self.matchRegex(virtualNodesLetterRegex)
         elif nodeType == 'number':
-            return self.matchRegex(virtualNodesNumber)
+            return self.matchRegex(virtualNodesNumberRegex)
         else:
             self.error("Invalid virtual node type", dev = True)
 
-    # Converts a textual Coxeter Diagram to a graph.
-    def toGraph(self) -> Graph:
+    # Reads through the string in a single pass, yielding its nodes, edges and spaces.
+    # Hyphens in the middle of the string are skipped.
+    def tokens(self) -> Iterator[Token]:
         self.index = 0
         cd = self.string
-
-        nodes: List[Node] = [] # The nodes in the final graph.
-        edges: List[Node] = [] # The node pairs to link in the final graph.
-
-        prevNodeRef: Optional[NodeRef] = None # The previously read node.
-        edgeLabel: str = "" # Most recently read edge label.
         readingNode: bool = True # Are we reading a node (or an edge)?
-        linkNodes: bool = False # Are we about to link nodes?
-        newNodeRef: Optional[NodeRef] = None # The new node to add.
 
-        # Reads through string.
         while self.index < len(cd):
-            # Skips spaces.
+            start = self.index
+
+            # Spaces separate components.
             if cd[self.index] == " ":
                 if readingNode:
                     self.error("Expected node label, got space instead.")
 
+                yield Token('space', " ", start, start)
                 readingNode = True
-                edgeLabel = ""
 
             # Skips hyphens in the middle of the string.
             elif cd[self.index] == "-":
@@ -146,10 +150,8 @@ class CD:
                     # Indexing starts at 1.
                     nodeIndex = int(virtualNode) - 1
 
-                newNodeRef = NodeRef(nodeIndex, self.index)
-
-                # Toggles the flag to link stuff.
-                linkNodes = True
+                yield Token('virtual', virtualNode, start, self.index, nodeIndex)
+                readingNode = False
 
             # Does lacing stuff.
             elif cd[self.index] == "&":
@@ -157,58 +159,89 @@ class CD:
 
             # Node values
             elif readingNode:
-                index = self.index
-                newNodeLabel = self.readNode()
-                if newNodeLabel == '':
+                label = self.readNode()
+                if label == '':
                     self.error("Invalid node symbol.")
 
                 # Removes parentheses.
-                if newNodeLabel[0] == '(':
-                    newNodeLabel = newNodeLabel[1:-1]
-
-                if len(nodes) > MAX_LEN:
-                    self.error("Diagram too big.")
-
-                newNodeRef = NodeRef(len(nodes), index)
-                nodes.append(Node(newNodeLabel, index))
+                if label[0] == '(':
+                    label = label[1:-1]
 
-                # Toggles the flag to link stuff.
-                linkNodes = True
+                yield Token('node', label, start, self.index)
+                readingNode = False
 
             # Edge values
             else:
-                edgeLabel = self.readNumber()
-
-                if edgeLabel == "":
+                label = self.readNumber()
+                if label == "":
                     self.error(f"Invalid edge symbol.")
 
-                if edgeLabel[0] == '(':
-                    edgeLabel = edgeLabel[1:-1]
+                # Removes parentheses.
+                if label[0] == '(':
+                    label = label[1:-1]
 
+                yield Token('edge', label, start, self.index)
                 readingNode = True
 
-            # Links two nodes if necessary.
-            if linkNodes:
-                if not (prevNodeRef is None or edgeLabel == ""):
-                    edges.append(EdgeRef(
-                        index0 = newNodeRef,
-                        index1 = prevNodeRef,
-                        label = edgeLabel,
-                    ))
-
-                # Updates variables.
-                linkNodes = False
-                prevNodeRef = newNodeRef
-                edgeLabel = ""
-                readingNode = False
-
             self.index += 1
 
         # Throws an error if the CD ends in an edge label.
         if readingNode:
             self.error("Node label expected, got string end instead.")
 
+    # Converts a textual Coxeter Diagram to a graph.
+    def toGraph(self) -> Graph:
+        values: List[str] = [] # The values of the nodes in the final graph.
+        positions: List[int] = [] # The positions of the nodes in the string.
+        edges: List[EdgeRef] = [] # The node pairs to link in the final graph.
+
+        prevNodeRef: Optional[NodeRef] = None # The previously read node.
+        edgeLabel: str = "" # Most recently read edge label.
+
+        # Consumes the token stream.
+        for token in self.tokens():
+            # A space breaks the link to the previous node.
+            if token.kind == 'space':
+                edgeLabel = ""
+                continue
+
+            # Stores the edge label until the next node is read.
+            elif token.kind == 'edge':
+                edgeLabel = token.label
+                continue
+
+            # Refers to a previously read node.
+            elif token.kind == 'virtual':
+                assert isinstance(token.nodeIndex, int)
+                newNodeRef = NodeRef(token.nodeIndex, token.end)
+
+            # Adds a new node.
+            else:
+                if len(values) > MAX_LEN:
+                    self.index = token.end
+                    self.error("Diagram too big.")
+
+                newNodeRef = NodeRef(len(values), token.start)
+                values.append('+' if token.label == 'ß' else token.label)
+                positions.append(token.start)
+
+            # Links two nodes if necessary.
+            if not (prevNodeRef is None or edgeLabel == ""):
+                edges.append(EdgeRef(
+                    index0 = newNodeRef,
+                    index1 = prevNodeRef,
+                    label = edgeLabel,
+                ))
+
+            # Updates variables.
+            prevNodeRef = newNodeRef
+            edgeLabel = ""
+
         # Links corresponding nodes.
+        links: List[Tuple[int, int, str]] = []
+        linked: Set[Tuple[int, int]] = set()
+        n = len(values)
+
         for edge in edges:
             # Checks if nodes in range.
             for i in range(2):
@@ -216,20 +249,38 @@ class CD:
                 self.index = edge[i].pos
 
                 index = edge[i].index
-                if index >= len(nodes) or index < -len(nodes):
+                if index >= n or index < -n:
                     self.error("Virtual node index out of range")
 
-            # Attempts to link each pair.
-            try:
-                # Configures where the error will appear.
-                self.index = max(edge[0].pos, edge[1].pos)
+            # Configures where the error will appear.
+            self.index = max(edge[0].pos, edge[1].pos)
+            index0, index1 = edge[0].index % n, edge[1].index % n
+
+            if index0 == index1:
+                self.error("Can't link node to self.")
+
+            if (min(index0, index1), max(index0, index1)) in linked:
+                self.error("Can't link two nodes twice.")
 
-                nodes[edge[0].index].linkTo(nodes[edge[1].index], edge.label)
-            except CDError as e:
-                self.error(str(e))
+            # Nodes linked by a 2 aren't linked at all.
+            if edge.label != "2":
+                linked.add((min(index0, index1), max(index0, index1)))
+                links.append((index0, index1, edge.label))
 
         # Returns the graph.
-        return Graph(nodes)
+        return Graph.fromEdges(values, positions, links)
+
+    # Gets the diagram with the values of its nodes replaced, in order.
+    def withValues(self, values: List[str]) -> str:
+        res = ""
+        start = 0
+        nodes = [token for token in self.tokens() if token.kind == 'node']
+
+        for token, value in zip(nodes, values):
+            res += self.string[start:token.start] + value
+            start = token.end + 1
+
+        return res + self.string[start:]
 
     # Raises an error with a certain message.
     # Shows as an "Unexpected error" if dev = True (these are errors that the devs didn't consider).
@@ -0,0 +1,238 @@
+import os
+import signal
+import asyncio
+import threading
+import multiprocessing
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+
+from src.py.cd import CD
+from src.py.node import Graph
+from src.py.exceptions import CDError, CalculationTimeout, PoolFull
+
+from typing import Any, Callable, List, Optional, Tuple
+
+# Version of the calculations, stored along with their results.
+# Bump it whenever a change could alter some result, so that old results are ignored.
+ENGINE_VERSION = "3"
+
+# Worker processes are forked, since spawning them would re-run the bot's main module.
+context = multiprocessing.get_context('fork')
+
+# The jobs that can be sent to the pool.
+# They're module-level so that they can be pickled.
+def parse(cd: str) -> Graph:
+    return CD(cd).toGraph()
+
+# Parses several diagrams, saying which one is wrong if any.
+def parseAll(cds: List[str]) -> List[Graph]:
+    graphs = []
+
+    for i, cd in enumerate(cds):
+        try:
+            graphs.append(CD(cd).toGraph())
+        except CDError as e:
+            raise CDError(f"Diagram {i + 1}: {e}")
+
+    return graphs
+
+def canonicalKey(cd: str) -> str:
+    return CD(cd).toGraph().canonicalKey()
+
+def circumradius(cd: str):
+    return CD(cd).toGraph().circumradius()
+
+def circumradiusNumeric(cd: str, digits: Optional[int] = None):
+    return CD(cd).toGraph().circumradiusNumeric(digits)
+
+# Gets the circumradius of every ringing of a diagram, along with the ringed diagram
+# and a decimal approximation.
+def family(cd: str, exact: bool, maxNodes: int) -> List[Tuple[str, Any, Any]]:
+    diagram = CD(cd)
+    graph = diagram.toGraph()
+
+    if len(graph) > maxNodes:
+        raise CDError(f"Families can only be listed for diagrams with up to {maxNodes} nodes.")
+
+    return [
+        (diagram.withValues(['x' if ring else 'o' for ring in ringing]), circ, circ.evalf())
+        for ringing, circ in graph.family(exact)
+    ]
+
+def space(cd: str) -> str:
+    return CD(cd).toGraph().spaceOf()
+
+# Main loop of a worker process: runs jobs until the pipe is closed.
+def work(conn: Connection) -> None:
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            result: Tuple[bool, Any] = (True, func(*args))
+        except Exception as e:
+            result = (False, e)
+
+        # The result might not be picklable.
+        try:
+            conn.send(result)
+        except Exception as e:
+            conn.send((False, Exception(f"Could not send back result: {e}")))
+
+# Main loop of the forker process: forks a worker for each pipe end it's sent,
+# and sends back its process id, until the pipe is closed.
+def forkWorkers(conn: Connection) -> None:
+    # Killed workers are reaped automatically.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    while True:
+        try:
+            childConn = Connection(reduction.recv_handle(conn))
+        except EOFError:
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                conn.close()
+                work(childConn)
+            finally:
+                os._exit(0)
+
+        childConn.close()
+        conn.send(pid)
+
+# A process that forks the workers, so that they're never forked from the bot itself.
+# It's forked before the bot starts any thread, and never starts any itself, so workers
+# can be forked safely even once the bot has threads holding locks.
+class Forker:
+    # Class constructor. Starts the process.
+    def __init__(self) -> None:
+        self.conn, childConn = context.Pipe()
+        self.process = context.Process(target = forkWorkers, args = (childConn,), daemon = True)
+        self.process.start()
+        childConn.close()
+
+        self.lock = threading.Lock()
+
+    # Forks a worker, and gets the pipe to it and its process id.
+    def fork(self) -> Tuple[Connection, int]:
+        conn, childConn = context.Pipe()
+
+        with self.lock:
+            reduction.send_handle(self.conn, childConn.fileno(), self.process.pid)
+            pid = self.conn.recv()
+
+        childConn.close()
+        return conn, pid
+
+    # Kills the process. Workers exit once their pipes are closed.
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+# A single worker process, which runs one job at a time.
+class Worker:
+    # Class constructor. Starts the process.
+    def __init__(self, forker: Forker) -> None:
+        self.conn, self.pid = forker.fork()
+
+    # Runs a job and waits for its result. Blocking.
+    def call(self, func: Callable, args: tuple, timeout: float) -> Any:
+        self.conn.send((func, args))
+
+        if not self.conn.poll(timeout):
+            raise CalculationTimeout(f"Calculation timed out after {timeout:g}s.")
+
+        success, result = self.conn.recv()
+        if not success:
+            raise result
+
+        return result
+
+    # Kills the process, whatever it's doing.
+    def kill(self) -> None:
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+        self.conn.close()
+
+# A pool of worker processes for heavy computations,
+# so that they don't block the event loop.
+class Pool:
+    # Class constructor.
+    # size is the number of worker processes, queueDepth the number of jobs that can wait for one.
+    def __init__(self, size: int, queueDepth: int, timeout: float) -> None:
+        self.size = size
+        self.queueDepth = queueDepth
+        self.timeout = timeout
+
+        self.forker = Forker()
+        self.idle: List[Worker] = [Worker(self.forker) for _ in range(size)]
+        self.pending: int = 0
+
+        # Created on first use, so that it's bound to the running loop.
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    # Runs func(*args) on a worker, and returns its result.
+    # If the job takes longer than the timeout, its worker is killed and replaced.
+    async def run(self, func: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        if self.pending >= self.size + self.queueDepth:
+            raise PoolFull("Too many calculations are running, try again later.")
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.size)
+
+        loop = asyncio.get_event_loop()
+        self.pending += 1
+
+        try:
+            await self.semaphore.acquire()
+        except asyncio.CancelledError:
+            self.pending -= 1
+            raise
+
+        worker = self.idle.pop()
+        future = loop.run_in_executor(None, worker.call, func, args, timeout or self.timeout)
+
+        # The worker is only given back once it's done, even if this request is cancelled,
+        # so that the next job never reads the reply to this one.
+        future.add_done_callback(lambda future: self.release(worker, future))
+        return await asyncio.shield(future)
+
+    # Gives a worker back once its job is done, and lets the next job run.
+    def release(self, worker: Worker, future: asyncio.Future) -> None:
+        self.pending -= 1
+
+        # The worker might be stuck, or dead. Forking its replacement waits on the forker,
+        # so it's done in the executor, and the next job runs once it's ready.
+        if future.cancelled() or isinstance(future.exception(), (CalculationTimeout, EOFError, OSError)):
+            worker.kill()
+            replacement = asyncio.get_event_loop().run_in_executor(None, Worker, self.forker)
+            replacement.add_done_callback(self.restore)
+            return
+
+        self.idle.append(worker)
+        self.semaphore.release() # type: ignore
+
+    # Adds a replacement worker to the pool once it's been forked.
+    # If the forker is gone, no more workers can be made, and the pool stays a worker short.
+    def restore(self, replacement: asyncio.Future) -> None:
+        if replacement.cancelled() or replacement.exception() is not None:
+            return
+
+        self.idle.append(replacement.result())
+        self.semaphore.release() # type: ignore
+
+    # Kills every idle worker, and the forker.
+    def close(self) -> None:
+        for worker in self.idle:
+            worker.kill()
+
+        self.idle = []
+        self.forker.kill()
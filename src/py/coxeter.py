@@ -0,0 +1,176 @@
+import math
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Recognizes the connected Coxeter diagrams of finite and affine groups, by their shapes.
+# Finite groups are those of spherical polytopes, and affine ones those of Euclidean tilings.
+# Everything here takes linear time, unlike the symbolic check in Graph.spaceOf.
+
+SUBSCRIPTS = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+
+# Orders of the exceptional finite groups.
+ORDERS = {'E6': 51840, 'E7': 2903040, 'E8': 696729600, 'F4': 1152, 'G2': 12, 'H3': 120, 'H4': 14400}
+
+# Branching diagrams with three arms of 3s, by the number of nodes on each arm, in increasing order.
+BRANCHED = {(1, 2, 2): 'E6', (1, 2, 3): 'E7', (1, 2, 4): 'E8', (2, 2, 2): '~E6', (1, 3, 3): '~E7', (1, 2, 5): '~E8'}
+
+# Gets the name and order of the Coxeter group of a connected diagram, with None as the order of
+# an affine group. Returns None if the group isn't finite or affine, or if it isn't recognized,
+# as with diagrams with fractional edge labels.
+def recognize(nodes: List[Any]) -> Optional[Tuple[str, Optional[int]]]:
+    name = typeOf(nodes)
+    if name is None:
+        return None
+
+    if name.startswith('~'):
+        return formatName(name[1:], True), None
+
+    return formatName(name, False), orderOf(name)
+
+# Gets the type of a connected diagram, like 'A4', 'I2(5)' or '~B3' for affine ones.
+def typeOf(nodes: List[Any]) -> Optional[str]:
+    n = len(nodes)
+    if n == 1:
+        return 'A1'
+
+    # Reads the edge labels, which must be integers.
+    labels: Dict[Tuple[Any, Any], int] = {}
+    for node in nodes:
+        for neighbor, label in zip(node.neighbors, node.edgeLabels):
+            if label == '∞' and n == 2:
+                return '~A1'
+            elif not label.isdecimal() or int(label) < 3:
+                return None
+
+            labels[node, neighbor] = int(label)
+
+    edges = len(labels) // 2
+    degrees = [node.degree() for node in nodes]
+
+    # Loops.
+    if edges == n:
+        if all(degree == 2 for degree in degrees) and all(label == 3 for label in labels.values()):
+            return f'~A{n - 1}'
+
+        return None
+    elif edges > n:
+        return None
+
+    # Only trees are left.
+    branches = [node for node in nodes if node.degree() > 2]
+
+    if not branches:
+        end = next(node for node in nodes if node.degree() == 1)
+        return pathType([labels[edge] for edge in walk(end, None)])
+
+    # Anything else only has 3s, save maybe for a 4 at the end of an arm.
+    special = [edge for edge, label in labels.items() if label != 3]
+
+    if len(branches) == 1:
+        center = branches[0]
+        arms = [walk(neighbor, center) for neighbor in center.neighbors]
+
+        # ~D4 is a star with four arms.
+        if len(arms) == 4:
+            return '~D4' if not special and all(len(arm) == 0 for arm in arms) else None
+        elif len(arms) != 3:
+            return None
+
+        lengths = tuple(sorted(len(arm) + 1 for arm in arms))
+
+        if not special:
+            if lengths[:2] == (1, 1):
+                return f'D{n}'
+
+            return BRANCHED.get(lengths)
+
+        # ~B: the 4 is on the last edge of the longest arm.
+        if len(special) == 2 and lengths[:2] == (1, 1) and all(labels[edge] == 4 for edge in special):
+            arm = max(arms, key = len)
+            last = arm[-1] if arm else (center, next(
+                neighbor for neighbor in center.neighbors if labels[center, neighbor] == 4
+            ))
+
+            if labels[last] == 4 and last[1].degree() == 1:
+                return f'~B{n - 1}'
+
+        return None
+
+    # ~D: a path with two forks at its ends.
+    if len(branches) == 2 and not special and all(node.degree() == 3 for node in branches):
+        if all(sum(neighbor.degree() == 1 for neighbor in node.neighbors) >= 2 for node in branches):
+            return f'~D{n - 1}'
+
+    return None
+
+# Walks along a path, from some node and away from another, up to the next end or branch.
+# Gets the edges it crosses, as pairs of nodes.
+def walk(node: Any, prev: Any) -> List[Tuple[Any, Any]]:
+    edges: List[Tuple[Any, Any]] = []
+
+    while True:
+        nexts = [neighbor for neighbor in node.neighbors if neighbor is not prev]
+        if len(nexts) != 1:
+            return edges
+
+        edges.append((node, nexts[0]))
+        prev, node = node, nexts[0]
+
+# Gets the type of a path diagram, from its edge labels in order.
+def pathType(labels: List[int]) -> Optional[str]:
+    n = len(labels) + 1
+
+    # Rank 2.
+    if n == 2:
+        return {3: 'A2', 4: 'B2', 6: 'G2'}.get(labels[0], f'I2({labels[0]})')
+
+    special = [(i, label) for i, label in enumerate(labels) if label != 3]
+    ends = (0, n - 2)
+
+    if not special:
+        return f'A{n}'
+    elif len(special) == 1:
+        i, label = special[0]
+
+        if label == 4 and i in ends:
+            return f'B{n}'
+        elif label == 5 and i in ends and n in (3, 4):
+            return f'H{n}'
+        elif label == 4 and n == 4 and i == 1:
+            return 'F4'
+        elif label == 4 and n == 5 and i in (1, 2):
+            return '~F4'
+        elif label == 6 and i in ends and n == 3:
+            return '~G2'
+    elif len(special) == 2:
+        if all(label == 4 for _, label in special) and tuple(i for i, _ in special) == ends:
+            return f'~C{n - 1}'
+
+    return None
+
+# Formats a type as a group name, like A₄, I₂(5) or B̃₃.
+def formatName(name: str, affine: bool) -> str:
+    letter, rest = name[0], name[1:]
+    index, _, label = rest.partition('(')
+
+    return letter + ('̃' if affine else '') + index.translate(SUBSCRIPTS) + ('(' + label if label else '')
+
+# Gets the order of a finite group from its type.
+def orderOf(name: str) -> int:
+    if name in ORDERS:
+        return ORDERS[name]
+
+    letter, rest = name[0], name[1:]
+
+    if letter == 'I':
+        return 2 * int(rest[rest.index('(') + 1:-1])
+
+    n = int(rest)
+    if letter == 'A':
+        return math.factorial(n + 1)
+    elif letter == 'B':
+        return 2**n * math.factorial(n)
+    elif letter == 'D':
+        return 2**(n - 1) * math.factorial(n)
+
+    raise ValueError(f"Unknown Coxeter group {name}.")
@@ -1,8 +1,13 @@
-from typing import Any, Callable, List, NoReturn, Tuple, cast
+from typing import Any, Callable, Dict, List, NoReturn, Optional, Tuple, cast
 from PIL import Image, ImageDraw, ImageFont
 from src.py.node import Node, Graph
 from src.py.exceptions import CDError
+import src.py.layout as Layout
+from xml.sax.saxutils import escape
+import io
 import math
+import threading
+import zlib
 
 # Constants:
 SCALE = 0.8
@@ -29,12 +34,217 @@ EDGE_FONT_SIZE = 24
 NODE_FONT_SIZE = 18
 HOLOSNUB_FONT_SIZE = 36
 
-EDGE_FONT = ImageFont.truetype(FONT_FILENAME, EDGE_FONT_SIZE, layout_engine = ImageFont.LAYOUT_BASIC)
-NODE_FONT = ImageFont.truetype(FONT_FILENAME, NODE_FONT_SIZE, layout_engine = ImageFont.LAYOUT_BASIC)
-HOLOSNUB_FONT = ImageFont.truetype(FONT_FILENAME, HOLOSNUB_FONT_SIZE, layout_engine = ImageFont.LAYOUT_BASIC)
-
 PADDING = 40
 
+# Grids of several diagrams.
+CAPTION_SPACING = 10 # Space between a diagram and its caption.
+
+# Rendering budget.
+MIN_SCALE = 0.25 # Diagrams that would have to be drawn smaller than this aren't drawn.
+SCALE_STEPS = 4 # Fitted scales are rounded down to powers of 2^(1/SCALE_STEPS), so that few styles are ever built.
+ASPECT_RATIO = 2 # Preferred width to height ratio when wrapping components into rows.
+
+# PNG encoding presets, from fastest to smallest.
+# Each is the number of grey levels to quantize to (None to keep them all),
+# the zlib compression level, and the zlib strategy.
+PNG_PRESETS = {
+    'lossless': (None, 6, zlib.Z_DEFAULT_STRATEGY),
+    'fast': (16, 1, zlib.Z_DEFAULT_STRATEGY),
+    'balanced': (16, 6, zlib.Z_FILTERED),
+    'small': (16, 9, zlib.Z_FILTERED),
+}
+
+# Sprites rasterised on startup.
+COMMON_NODES = ('o', 'x', 's', '+', 'q', 'f', 'v', 'h', 'k', 'u', 'w', 'F')
+COMMON_LABELS = ('4', '5', '6', '8', '5/2', '∞')
+
+# The sizes of everything drawn, in pixels, at some scale.
+# Drawing at the final scale means the image never has to be resized.
+class Style:
+    # Styles that have already been built, by scale.
+    __styles: Dict[float, 'Style'] = {}
+    __lock = threading.Lock()
+
+    # Class constructor.
+    def __init__(self, scale: float) -> None:
+        self.scale = scale
+
+        self.nodeRadius = NODE_RADIUS * scale
+        self.nodeBorderWidth = Style.width(NODE_BORDER_WIDTH * scale)
+        self.ringRadius = RING_RADIUS * scale
+        self.ringWidth = Style.width(RING_WIDTH * scale)
+        self.lineWidth = Style.width(LINE_WIDTH * scale)
+        self.textDistance = TEXT_DISTANCE * scale
+        self.ellipsisRadius = ELLIPSIS_RADIUS * scale
+        self.fontOutline = Style.width(FONT_OUTLINE * scale)
+
+        self.edgeFont = Style.font(EDGE_FONT_SIZE * scale)
+        self.nodeFont = Style.font(NODE_FONT_SIZE * scale)
+        self.holosnubFont = Style.font(HOLOSNUB_FONT_SIZE * scale)
+
+        # Fonts can't be used by several threads at once, and the atlas is filled in as it's used.
+        self.lock = threading.RLock()
+        self.atlas = Atlas(self)
+
+    # Gets the style for some scale, building it if needed.
+    @staticmethod
+    def of(scale: float) -> 'Style':
+        with Style.__lock:
+            style = Style.__styles.get(scale)
+
+            if style is None:
+                style = Style(scale)
+                Style.__styles[scale] = style
+
+            return style
+
+    # Rounds a line width, which must be at least a pixel.
+    @staticmethod
+    def width(width: float) -> int:
+        return max(1, round(width))
+
+    # Loads the font at some size.
+    @staticmethod
+    def font(size: float) -> Any:
+        return ImageFont.truetype(FONT_FILENAME, max(1, round(size)), layout_engine = ImageFont.LAYOUT_BASIC)
+
+# Pre-rasterised sprites of nodes and edge labels, which get pasted onto diagrams.
+# Sprites for other nodes and labels are rasterised the first time they're needed.
+class Atlas:
+    # Class constructor.
+    def __init__(self, style: Style) -> None:
+        self.style = style
+
+        # Node sprites, with the node's center at the sprite's center.
+        self.nodes: Dict[str, Image.Image] = {}
+
+        # Pairs of masks for the outline and the text of each label.
+        self.labels: Dict[str, Tuple[Image.Image, Image.Image]] = {}
+
+        for value in COMMON_NODES:
+            self.node(value)
+
+        for label in COMMON_LABELS:
+            self.label(label)
+
+    # Gets the sprite for a node.
+    def node(self, value: str) -> Image.Image:
+        with self.style.lock:
+            sprite = self.nodes.get(value)
+
+            if sprite is None:
+                sprite = self.drawNode(value)
+                self.nodes[value] = sprite
+
+            return sprite
+
+    # Gets the outline and text masks for an edge label.
+    def label(self, text: str) -> Tuple[Image.Image, Image.Image]:
+        with self.style.lock:
+            masks = self.labels.get(text)
+
+            if masks is None:
+                masks = self.drawLabel(text)
+                self.labels[text] = masks
+
+            return masks
+
+    # Rasterises a node.
+    def drawNode(self, value: str) -> Image.Image:
+        style = self.style
+
+        # Chooses the fill color.
+        if value == 's' or value == '+':
+            nodeFill = 'white'
+            radius = style.ringRadius
+        else:
+            nodeFill = 'black'
+            radius = style.nodeRadius
+
+        # Configures the mark.
+        if value == '+':
+            font = style.holosnubFont
+            foreColor, backColor = 'black', 'white'
+
+            # Offset, seems necessary for some reason.
+            offset = (0.5, -3)
+        else:
+            font = style.nodeFont
+            foreColor, backColor = 'white', 'black'
+
+            # Offset, seems necessary for some reason.
+            offset = (1, -2)
+
+        # Makes the sprite big enough for both the ring and the mark.
+        textSize = font.getsize(value)
+        half = math.ceil(max(style.ringRadius, max(textSize) / 2 + 3 * style.scale + style.fontOutline))
+        center = (half, half)
+
+        image = Image.new('RGBA', (2 * half + 1, 2 * half + 1), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+
+        # Draws the node.
+        draw.ellipse(
+            xy = Atlas.box(center, radius),
+            fill = nodeFill,
+            outline = 'black',
+            width = style.nodeBorderWidth
+        )
+
+        # Draws the ring.
+        if value != 'o' and value != 's':
+            draw.arc(
+                xy = Atlas.box(center, style.ringRadius),
+                start = 0,
+                end = 360,
+                fill = 'black',
+                width = style.ringWidth
+            )
+
+            # Draws the mark.
+            if value != 'x':
+                xy = Draw.applyCoords(lambda a, b: a + b * style.scale, center, offset)
+                xy = Draw.applyCoords(lambda a, b: a - b / 2, xy, textSize)
+                self.drawText(draw, xy, value, font, foreColor, backColor)
+
+        return image
+
+    # Rasterises an edge label into an outline mask and a text mask.
+    # The masks have a margin of twice the outline width around the text.
+    def drawLabel(self, text: str) -> Tuple[Image.Image, Image.Image]:
+        font = self.style.edgeFont
+        width, height = font.getsize(text)
+        margin = 2 * self.style.fontOutline
+        size = (width + 2 * margin, height + 2 * margin)
+
+        outline = Image.new('L', size, 0)
+        self.drawText(ImageDraw.Draw(outline), (margin, margin), text, font, None, 255)
+
+        fill = Image.new('L', size, 0)
+        self.drawText(ImageDraw.Draw(fill), (margin, margin), text, font, 255, None)
+
+        return outline, fill
+
+    # Draws text with a border, with its top left corner at some position.
+    # Either of the colors can be None to skip that part.
+    def drawText(self, draw: Any, xy: Tuple[float, float], text: str, font: Any, foreColor: Any, backColor: Any) -> None:
+        x, y = Draw.applyCoord(round, xy)
+        outline = self.style.fontOutline
+
+        # Draws border.
+        if backColor is not None:
+            for dx, dy in ((-outline, 0), (outline, 0), (0, -outline), (0, outline)):
+                draw.text(xy = (x + dx, y + dy), text = text, fill = backColor, font = font)
+
+        # Overlays text.
+        if foreColor is not None:
+            draw.text(xy = (x, y), text = text, fill = foreColor, font = font)
+
+    # Gets the bounding box of a circle.
+    @staticmethod
+    def box(xy: Tuple[int, int], radius: float) -> Tuple[float, float, float, float]:
+        return (xy[0] - radius, xy[1] - radius, xy[0] + radius, xy[1] + radius)
+
 # Stores properties of a node that will be drawn on screen.
 class DrawNode:
     # Class constructor.
@@ -62,7 +272,24 @@ class DrawEdge:
 # Draws a graph.
 class Draw:
     # Class constructor.
-    def __init__(self, graph: Graph) -> None:
+    # The diagram is drawn at supersample times the final scale, and then shrunk down to it.
+    # If maxPixels is set, the canvas is kept below that many pixels, by giving up on supersampling,
+    # then switching to a compact layout, and then drawing at a smaller scale.
+    def __init__(
+        self, graph: Graph, scale: float = SCALE, supersample: int = 1, maxPixels: Optional[int] = None
+    ) -> None:
+        self.scale = scale
+        self.supersample = supersample
+        self.layOut(graph, compact = False)
+
+        if maxPixels is not None:
+            self.fit(graph, maxPixels)
+
+        self.style = Style.of(self.scale * self.supersample)
+
+    # Places every component of the graph.
+    # A compact layout draws big loops in two rows, and wraps components into rows.
+    def layOut(self, graph: Graph, compact: bool) -> None:
         # Variables to see where the next node goes.
         # Provisional, probably.
         self.x: float = 0
@@ -75,8 +302,67 @@ class Draw:
         # The bounding box of the graph.
         self.minX, self.minY, self.maxX, self.maxY = math.inf, math.inf, -math.inf, -math.inf
 
+        # The index of each node of the graph in the array of drawn nodes.
+        self.drawIndices: Dict[Node, int] = {}
+
+        # The nodes of each component are contiguous.
+        ranges: List[Tuple[int, int]] = []
         for component in graph.components():
-            self.add(component)
+            start = len(self.nodes)
+            self.add(component, compact)
+            ranges.append((start, len(self.nodes)))
+
+        if compact:
+            self.wrap(ranges)
+
+    # Makes the canvas fit in some number of pixels.
+    def fit(self, graph: Graph, maxPixels: int) -> None:
+        if self.pixels(self.scale * self.supersample) > maxPixels:
+            self.supersample = 1
+
+        if self.pixels(self.scale) > maxPixels:
+            self.layOut(graph, compact = True)
+
+        if self.pixels(self.scale) > maxPixels:
+            # Rounding might leave the canvas a few pixels too big.
+            width, height = self.size()
+            scale = math.sqrt(maxPixels / ((width + 1) * (height + 1)))
+
+            if scale < MIN_SCALE:
+                self.error("Diagram is too large to draw.")
+
+            self.scale = 2 ** (math.floor(math.log2(scale) * SCALE_STEPS) / SCALE_STEPS)
+
+    # The number of pixels of the canvas at some scale.
+    def pixels(self, scale: float) -> int:
+        width, height = self.size(scale)
+        return width * height
+
+    # Arranges the components in rows, so that the diagram is roughly ASPECT_RATIO times as wide as it's tall.
+    def wrap(self, ranges: List[Tuple[int, int]]) -> None:
+        boxes = []
+        for start, end in ranges:
+            xs = [node.xy[0] for node in self.nodes[start:end]]
+            ys = [node.xy[1] for node in self.nodes[start:end]]
+            boxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+        area = sum((box[2] - box[0] + COMPONENT_SPACING) * (box[3] - box[1] + COMPONENT_SPACING) for box in boxes)
+        rowWidth = max(max(box[2] - box[0] for box in boxes), math.sqrt(area * ASPECT_RATIO))
+
+        self.minX, self.minY, self.maxX, self.maxY = math.inf, math.inf, -math.inf, -math.inf
+        x, y, rowHeight = 0.0, 0.0, 0.0
+
+        for (start, end), (minX, minY, maxX, maxY) in zip(ranges, boxes):
+            # Starts a new row.
+            if x > 0 and x + maxX - minX > rowWidth:
+                x, y, rowHeight = 0.0, y + rowHeight + COMPONENT_SPACING, 0.0
+
+            for node in self.nodes[start:end]:
+                node.xy = (node.xy[0] - minX + x, node.xy[1] - minY + y)
+                self.updateBoundingBox(node.xy)
+
+            x += maxX - minX + COMPONENT_SPACING
+            rowHeight = max(rowHeight, maxY - minY)
 
     def currentPos(self) -> Tuple[float, float]:
         return (self.x, self.y)
@@ -99,9 +385,8 @@ class Draw:
         return f(coords0[0], coords1[0]), f(coords0[1], coords1[1])
 
     # Adds a new component to the diagram.
-    # Currently, just puts everything in a straight line.
-    # TODO: make this draw the trees prettily.
-    def add(self, component: Graph) -> None:
+    # Paths are drawn in a straight line, other components are laid out by Layout.arrange.
+    def add(self, component: Graph, compact: bool = False) -> None:
         straight, firstNode = self.isStraight(component)
 
         if straight:
@@ -127,25 +412,20 @@ class Draw:
                 self.x += NODE_SPACING
                 self.addNode(node, self.currentPos(), drawingMode)
         else:
-            drawingMode = 'polygon'
+            positions, drawingMode = Layout.arrange(component, NODE_SPACING, compact)
+            minX = min(x for x, _ in positions.values())
+            maxX = max(x for x, _ in positions.values())
 
-            n = len(component)
-            radius = NODE_SPACING / (2 * math.sin(math.pi / n))
-            self.x += radius
-
-            angle = math.pi / 2 + math.pi / n
             for node in component:
-                self.addNode(node, (
-                    self.x + radius * math.cos(angle),
-                    self.y + radius * math.sin(angle)
-                ), drawingMode)
-                angle += 2 * math.pi / n
+                x, y = positions[node]
+                self.addNode(node, (self.x + x - minX, self.y + y), drawingMode)
 
-            self.x += radius
+            self.x += maxX - minX
 
         self.x += COMPONENT_SPACING
 
     # Adds a node in a particular position.
+    # In tree mode, horizontal edges are drawn as in a line, and the rest as in a polygon.
     def addNode(self, node: Node, coords: Tuple[float, float], drawingMode: str) -> None:
         # Adds the node.
         newNode = DrawNode(
@@ -154,24 +434,27 @@ class Draw:
         )
         self.updateBoundingBox(coords)
 
-        # Updates the graphIndex property to the node, storing its index in the new array.
-        node.drawIndex = len(self.nodes)
+        # Stores the node's index in the new array.
+        index = len(self.nodes)
+        self.drawIndices[node] = index
         self.nodes.append(newNode)
 
         # Adds edges.
-        i = 0
-        for neighbor in node.neighbors:
+        for neighbor, label in zip(node.neighbors, node.edgeLabels):
             # Guarantees no duplicates.
-            if neighbor.drawIndex is not None:
+            neighborIndex = self.drawIndices.get(neighbor)
+            if neighborIndex is not None:
+                edgeMode = drawingMode
+                if edgeMode == 'tree':
+                    edgeMode = 'line' if self.nodes[neighborIndex].xy[1] == coords[1] else 'polygon'
+
                 self.edges.append(DrawEdge(
-                    index0 = neighbor.drawIndex,
-                    index1 = node.drawIndex,
-                    label = node.edgeLabels[i],
-                    drawingMode = drawingMode
+                    index0 = neighborIndex,
+                    index1 = index,
+                    label = label,
+                    drawingMode = edgeMode
                 ))
 
-            i += 1
-
     # A connected graph is a line graph iff every vertex has degree ≤ 2,
     # and at least one vertex has degree 1.
     # Returns whether the graph is a line graph, and if so, its first node (in string order).
@@ -196,7 +479,8 @@ class Draw:
 
     # Transforms node coordinates to image coordinates.
     def transformCoords(self, coords: Tuple[float, float]) -> Tuple[float, float]:
-        return (coords[0] - self.minX + PADDING, coords[1] - self.minY + PADDING)
+        scale = self.style.scale
+        return ((coords[0] - self.minX + PADDING) * scale, (coords[1] - self.minY + PADDING) * scale)
 
     # Updates the bounding box of the nodes.
     def updateBoundingBox(self, coords: Tuple[float, float]) -> None:
@@ -207,16 +491,16 @@ class Draw:
         self.minY = min(self.minY, y)
         self.maxY = max(self.maxY, y)
 
-    # Gets the size of the bounding box.
-    def size(self) -> Tuple[float, float]:
+    # Gets the size of the bounding box, at some scale.
+    def size(self, scale: float = 1) -> Tuple[int, int]:
         return (
-            round(self.maxX - self.minX + 2 * PADDING),
-            round(self.maxY - self.minY + 2 * PADDING)
+            round((self.maxX - self.minX + 2 * PADDING) * scale),
+            round((self.maxY - self.minY + 2 * PADDING) * scale)
         )
 
     # Draws the graph.
     def toImage(self) -> Image:
-        self.image = Image.new('RGB', size = self.size(), color = 'white')
+        self.image = Image.new('RGB', size = self.size(self.style.scale), color = 'white')
         self.draw = ImageDraw.Draw(self.image)
 
         # Draws the edges.
@@ -232,142 +516,121 @@ class Draw:
             # Text coordinates.
             textXy = Draw.applyCoords(lambda a, b: (a + b) / 2, edgeXy[0], edgeXy[1])
             if edge.drawingMode == 'line':
-                textXy = (textXy[0], textXy[1] + TEXT_DISTANCE)
+                textXy = (textXy[0], textXy[1] + self.style.textDistance)
 
             # Draws edge.
-            if label == 'Ø':
-                edgeType = 'dotted'
-            elif label[:3] == '...':
-                edgeType = 'ellipsis'
-            else:
-                edgeType = 'normal'
-
+            edgeType = Draw.edgeType(label)
             self.drawEdge(edgeXy, edgeType)
 
             # Draws label.
             if edgeType == 'normal' and label != '3':
-                self.drawText(textXy, label, textType = 'edge')
+                self.pasteLabel(textXy, label)
 
         # Draws each node.
         for node in self.nodes:
-            value = node.value
-            xy = self.transformCoords(node.xy)
-
-            # Chooses the fill color.
-            if value == 's' or value == '+':
-                nodeFill = 'white'
-                radius = RING_RADIUS
-            else:
-                nodeFill = 'black'
-                radius = NODE_RADIUS
-
-            # Draws the node.
-            self.__drawCircle(xy = xy, radius = radius, fill = nodeFill)
-
-            # Draws the ring.
-            if value != 'o' and value != 's':
-                self.__drawRing(xy = xy, radius = RING_RADIUS)
+            self.pasteNode(self.transformCoords(node.xy), node.value)
 
-                # Draws the mark.
-                if value != 'x':
-                    if value == '+':
-                        textType = 'holosnub'
-                    else:
-                        textType = 'node'
+        if self.supersample == 1:
+            return self.image
 
-                    self.drawText(xy = xy, text = value, textType = textType)
-
-        return self.image.resize(
-            size = (round(self.image.size[0] * SCALE), round(self.image.size[1] * SCALE)),
-            resample = Image.BICUBIC
-        )
+        return self.image.resize(size = self.size(self.scale), resample = Image.BOX)
 
     # Draws an edge on the image, of one of various parts..
     def drawEdge(self, xy: Tuple[Tuple[float, float], Tuple[float, float]], edgeType: str) -> None:
         if edgeType == 'normal':
             self.__drawLine(
                 xy = xy,
-                width = LINE_WIDTH,
+                width = self.style.lineWidth,
                 fill = 'black'
             )
 
         elif edgeType == 'dotted':
-            # Number of dashes in edge.
-            dashes = 5
-
-            # Direction vector of each dash.
-            delta: Tuple[float, float] = Draw.applyCoords(lambda x, y: (y - x) / (2 * dashes - 1), xy[0], xy[1])
-
-            xy = (xy[0], Draw.applyCoords(lambda x, y: x + y, xy[0], delta))
-
-            for i in range(dashes):
+            for dash in Draw.dashes(xy):
                 self.__drawLine(
-                    xy = xy,
-                    width = LINE_WIDTH,
+                    xy = dash,
+                    width = self.style.lineWidth,
                     fill = 'black'
                 )
 
-                xy = (
-                    Draw.applyCoords(lambda x, y: x + 2 * y, xy[0], delta),
-                    Draw.applyCoords(lambda x, y: x + 2 * y, xy[1], delta)
-                )
-
         elif edgeType == 'ellipsis':
-            # Controls the dot spacing.
-            spacing = 6
-
-            # Direction vector between two ellipses.
-            delta = Draw.applyCoords(lambda x, y: (y - x) / spacing, xy[0], xy[1])
-
-            circleXy = Draw.applyCoords(lambda x, y: x + y * (spacing / 2 - 1), xy[0], delta)
-
-            for i in range(3):
+            for circleXy in Draw.dots(xy):
                 self.__drawCircle(
                     xy = circleXy,
-                    radius = ELLIPSIS_RADIUS,
+                    radius = self.style.ellipsisRadius,
                     fill = 'black'
                 )
-
-                circleXy = Draw.applyCoords(lambda x, y: x + y, circleXy, delta)
         else:
             self.error("Edge type not recognized.", dev = True)
 
-    # Draws text with a border at some particular location.
-    def drawText(self, xy: Tuple[float, float], text: str, textType: str) -> None:
-        # Configures text attributes.
-        if textType == 'node':
-            font = NODE_FONT
-            foreColor = 'white'
-            backColor = 'black'
+    # Gets the type of edge with some label.
+    @staticmethod
+    def edgeType(label: str) -> str:
+        if label == 'Ø':
+            return 'dotted'
+        elif label[:3] == '...':
+            return 'ellipsis'
+        else:
+            return 'normal'
 
-            # Offset, seems necessary for some reason.
-            xy = Draw.applyCoords(lambda a, b: a + b, xy, (1, -2))
-        elif textType == 'holosnub':
-            font = HOLOSNUB_FONT
-            foreColor = 'black'
-            backColor = 'white'
+    # Gets the dashes that make up a dotted edge.
+    @staticmethod
+    def dashes(xy: Tuple[Tuple[float, float], Tuple[float, float]]) -> List[Tuple[Tuple[float, float], Tuple[float, float]]]:
+        # Number of dashes in edge.
+        dashes = 5
 
-            # Offset, seems necessary for some reason.
-            xy = Draw.applyCoords(lambda a, b: a + b, xy, (0.5, -3))
-        elif textType == 'edge':
-            font = EDGE_FONT
-            foreColor = 'black'
-            backColor = 'white'
-        else:
-            self.error("Text type not recognized.", dev = True)
+        # Direction vector of each dash.
+        delta: Tuple[float, float] = Draw.applyCoords(lambda x, y: (y - x) / (2 * dashes - 1), xy[0], xy[1])
 
-        # Positions text correctly.
-        textSize: Tuple[float, float] = self.draw.textsize(text = text, font = font)
-        xy = Draw.applyCoords(lambda a, b: a - b / 2, xy, textSize)
+        xy = (xy[0], Draw.applyCoords(lambda x, y: x + y, xy[0], delta))
+        res = []
 
-        # Draws border.
-        self.__drawText(xy = (xy[0] - FONT_OUTLINE, xy[1]), text = text, fill = backColor, font = font)
-        self.__drawText(xy = (xy[0] + FONT_OUTLINE, xy[1]), text = text, fill = backColor, font = font)
-        self.__drawText(xy = (xy[0], xy[1] - FONT_OUTLINE), text = text, fill = backColor, font = font)
-        self.__drawText(xy = (xy[0], xy[1] + FONT_OUTLINE), text = text, fill = backColor, font = font)
+        for i in range(dashes):
+            res.append(xy)
 
-        # Overlays text.
-        self.__drawText(xy = xy, text = text, fill = foreColor, font = font)
+            xy = (
+                Draw.applyCoords(lambda x, y: x + 2 * y, xy[0], delta),
+                Draw.applyCoords(lambda x, y: x + 2 * y, xy[1], delta)
+            )
+
+        return res
+
+    # Gets the centers of the dots that make up an ellipsis edge.
+    @staticmethod
+    def dots(xy: Tuple[Tuple[float, float], Tuple[float, float]]) -> List[Tuple[float, float]]:
+        # Controls the dot spacing.
+        spacing = 6
+
+        # Direction vector between two ellipses.
+        delta = Draw.applyCoords(lambda x, y: (y - x) / spacing, xy[0], xy[1])
+
+        circleXy = Draw.applyCoords(lambda x, y: x + y * (spacing / 2 - 1), xy[0], delta)
+        res = []
+
+        for i in range(3):
+            res.append(circleXy)
+            circleXy = Draw.applyCoords(lambda x, y: x + y, circleXy, delta)
+
+        return res
+
+    # Pastes a node's sprite centered at some position.
+    def pasteNode(self, xy: Tuple[float, float], value: str) -> None:
+        sprite = self.style.atlas.node(value)
+        half = sprite.size[0] // 2
+        x, y = Draw.applyCoord(round, xy)
+
+        self.image.paste(sprite, (x - half, y - half, x + half + 1, y + half + 1), sprite)
+
+    # Pastes an edge label centered at some position.
+    def pasteLabel(self, xy: Tuple[float, float], text: str) -> None:
+        outline, fill = self.style.atlas.label(text)
+        margin = 2 * self.style.fontOutline
+        width, height = outline.size[0] - 2 * margin, outline.size[1] - 2 * margin
+
+        x, y = Draw.applyCoord(round, Draw.applyCoords(lambda a, b: a - b / 2, xy, (width, height)))
+        box = (x - margin, y - margin, x - margin + outline.size[0], y - margin + outline.size[1])
+
+        self.image.paste('white', box, outline)
+        self.image.paste('black', box, fill)
 
     # Primitive to draw a line on the image.
     def __drawLine(self, xy: Tuple[Tuple[float, float], Tuple[float, float]], width: int, fill: str) -> None:
@@ -381,7 +644,7 @@ class Draw:
         )
 
     # Primitive to draw a circle on the image.
-    def __drawCircle(self, xy: Tuple[float, float], radius: int, fill: str) -> None:
+    def __drawCircle(self, xy: Tuple[float, float], radius: float, fill: str) -> None:
         # Rounds coordinates.
         x, y = xy
         circleXy = (
@@ -393,30 +656,180 @@ class Draw:
             xy = circleXy,
             fill = fill,
             outline = 'black',
-            width = NODE_BORDER_WIDTH
+            width = self.style.nodeBorderWidth
         )
 
-    # Primitive to draw a ring on the image.
-    def __drawRing(self, xy: Tuple[float, float], radius: int) -> None:
-        # Rounds coordinates.
-        x, y = xy
-        ringXy = (
-            Draw.applyCoord(round, (x - radius, y - radius)),
-            Draw.applyCoord(round, (x + radius, y + radius))
-        )
+    # Encodes the graph as a PNG file, with one of the PNG_PRESETS.
+    def toBytes(self, preset: str = 'balanced', vector: bool = False) -> bytes:
+        return Draw.encode(self.toRaster(vector), preset)
 
-        self.draw.arc(
-            xy = ringXy,
-            start = 0,
-            end = 360,
-            fill = 'black',
-            width = RING_WIDTH
-        )
+    # Draws the graph.
+    # If vector is set, the diagram is drawn as an SVG file and rasterized from it.
+    def toRaster(self, vector: bool = False) -> Image:
+        if not vector:
+            return self.toImage()
+
+        image = Image.new('RGB', self.size(self.scale), 'white')
+        svg = Draw.rasterize(self.toSVG()).convert('RGBA')
+        image.paste(svg, (0, 0), svg)
+        return image
+
+    # Puts several diagrams in a grid, each with a caption below it.
+    @staticmethod
+    def grid(images: List[Image.Image], captions: List[str], scale: float = SCALE) -> Image.Image:
+        # A font of its own, since fonts can't be used by several threads at once.
+        font = Style.font(EDGE_FONT_SIZE * scale)
+        columns = math.ceil(math.sqrt(len(images)))
+        rows = math.ceil(len(images) / columns)
+
+        # The size of each cell, with its caption.
+        cells = []
+        for image, caption in zip(images, captions):
+            captionWidth, captionHeight = font.getsize(caption)
+            cells.append((
+                max(image.size[0], captionWidth + 2 * CAPTION_SPACING),
+                image.size[1] + captionHeight + 2 * CAPTION_SPACING
+            ))
+
+        widths = [max(cells[i][0] for i in range(column, len(cells), columns)) for column in range(columns)]
+        heights = [max(cell[1] for cell in cells[row * columns:(row + 1) * columns]) for row in range(rows)]
+
+        grid = Image.new('RGB', (sum(widths), sum(heights)), 'white')
+        draw = ImageDraw.Draw(grid)
+
+        for i, (image, caption) in enumerate(zip(images, captions)):
+            row, column = divmod(i, columns)
+            x, y = sum(widths[:column]), sum(heights[:row])
+
+            # Centers the diagram horizontally in its cell.
+            grid.paste(image, (x + (widths[column] - image.size[0]) // 2, y))
+
+            captionWidth, _ = font.getsize(caption)
+            draw.text(
+                xy = (x + (widths[column] - captionWidth) // 2, y + image.size[1] + CAPTION_SPACING),
+                text = caption,
+                fill = 'black',
+                font = font
+            )
+
+        return grid
+
+    # Encodes a diagram as a PNG file.
+    # Diagrams are only ever black, white and grey, so they're stored as greyscale,
+    # or as a palette of a few greys, which keeps most of the antialiasing.
+    @staticmethod
+    def encode(image: Image, preset: str = 'balanced') -> bytes:
+        levels, level, strategy = PNG_PRESETS[preset]
+        image = image.convert('L')
+        options: Dict[str, Any] = {}
+
+        if levels is not None:
+            image = image.point([round(v * (levels - 1) / 255) for v in range(256)])
+            image.putpalette([round(i * 255 / (levels - 1)) for i in range(levels) for _ in range(3)])
+            options['bits'] = math.ceil(math.log2(levels))
+
+        buffer = io.BytesIO()
+        image.save(buffer, format = 'PNG', compress_level = level, compress_type = strategy, **options)
+        return buffer.getvalue()
+
+    # Draws the graph as an SVG file.
+    # Its size only depends on the number of nodes and edges, not on the size of the diagram.
+    def toSVG(self) -> str:
+        width, height = self.size()
+        scaledWidth, scaledHeight = self.size(self.scale)
+
+        # The SVG is drawn in layout coordinates, and scaled through the viewBox.
+        def coords(xy: Tuple[float, float]) -> str:
+            return f'{xy[0] - self.minX + PADDING:.2f} {xy[1] - self.minY + PADDING:.2f}'
+
+        def point(xy: Tuple[float, float], x: str = 'x', y: str = 'y') -> str:
+            px, py = coords(xy).split()
+            return f'{x}="{px}" {y}="{py}"'
+
+        def text(xy: Tuple[float, float], value: str, size: int, fill: str, stroke: str) -> str:
+            return (
+                f'<text {point(xy)} font-size="{size}" fill="{fill}" stroke="{stroke}" '
+                f'stroke-width="{2 * FONT_OUTLINE}">{escape(value)}</text>'
+            )
 
-    # Primitive to draw text on the image.
-    def __drawText(self, xy: Tuple[float, float], text: str, fill: str, font: ImageFont) -> None:
-        xy = Draw.applyCoord(round, xy)
-        self.draw.text(xy = xy, text = text, fill = fill, font = font)
+        elements = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{scaledWidth}" height="{scaledHeight}" '
+            f'viewBox="0 0 {width} {height}" font-family="Lora, serif" text-anchor="middle" '
+            f'dominant-baseline="central" paint-order="stroke">',
+            f'<rect width="{width}" height="{height}" fill="white"/>'
+        ]
+
+        # Draws the edges.
+        edges: List[str] = []
+        labels: List[str] = []
+        dots: List[str] = []
+
+        for edge in self.edges:
+            xy0, xy1, label = self.nodes[edge[0]].xy, self.nodes[edge[1]].xy, edge.label
+            edgeType = Draw.edgeType(label)
+
+            if edgeType == 'normal':
+                edges.append(f'M{coords(xy0)}L{coords(xy1)}')
+
+                if label != '3':
+                    textXy = Draw.applyCoords(lambda a, b: (a + b) / 2, xy0, xy1)
+                    if edge.drawingMode == 'line':
+                        textXy = (textXy[0], textXy[1] + TEXT_DISTANCE)
+
+                    labels.append(text(textXy, label, EDGE_FONT_SIZE, 'black', 'white'))
+
+            elif edgeType == 'dotted':
+                for dash in Draw.dashes((xy0, xy1)):
+                    edges.append(f'M{coords(dash[0])}L{coords(dash[1])}')
+
+            else:
+                for dot in Draw.dots((xy0, xy1)):
+                    dots.append(f'<circle {point(dot, "cx", "cy")} r="{ELLIPSIS_RADIUS}"/>')
+
+        if edges:
+            elements.append(f'<path d="{"".join(edges)}" stroke="black" stroke-width="{LINE_WIDTH}"/>')
+
+        elements += dots
+        elements += labels
+
+        # Draws each node.
+        for node in self.nodes:
+            value = node.value
+            center = point(node.xy, 'cx', 'cy')
+
+            if value == 's' or value == '+':
+                elements.append(
+                    f'<circle {center} r="{RING_RADIUS - NODE_BORDER_WIDTH / 2}" fill="white" '
+                    f'stroke="black" stroke-width="{NODE_BORDER_WIDTH}"/>'
+                )
+            else:
+                elements.append(f'<circle {center} r="{NODE_RADIUS}"/>')
+
+            if value != 'o' and value != 's':
+                elements.append(
+                    f'<circle {center} r="{RING_RADIUS - RING_WIDTH / 2}" fill="none" '
+                    f'stroke="black" stroke-width="{RING_WIDTH}"/>'
+                )
+
+                if value == '+':
+                    elements.append(text(node.xy, value, HOLOSNUB_FONT_SIZE, 'black', 'white'))
+                elif value != 'x':
+                    elements.append(text(node.xy, value, NODE_FONT_SIZE, 'white', 'black'))
+
+        elements.append('</svg>')
+        return '\n'.join(elements)
+
+    # Rasterizes an SVG file into an image.
+    # Requires cairosvg, which isn't needed otherwise.
+    @staticmethod
+    def rasterize(svg: str) -> Image:
+        # cairosvg raises OSError if it can't find the cairo library.
+        try:
+            import cairosvg
+        except (ImportError, OSError):
+            raise Exception("Rasterizing SVG files requires cairosvg.")
+
+        return Image.open(io.BytesIO(cairosvg.svg2png(bytestring = svg.encode('utf-8'))))
 
     # Shows the graph.
     def show(self) -> None:
@@ -432,4 +845,7 @@ class Draw:
         if dev:
             raise Exception(msg)
         else:
-            raise CDError(msg)
\ No newline at end of file
+            raise CDError(msg)
+
+# Builds the sprites for the default scale on startup.
+Style.of(SCALE)
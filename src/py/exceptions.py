@@ -1,13 +1,27 @@
-from mwclient.errors import MwClientError
-
 # Represents any error that's on the user's fault.
 class CDError(Exception):
     pass
 
+# Error thrown when the wiki can't be reached, or refuses a request.
+class WikiError(Exception):
+    pass
+
 # Error thrown when a redirect chain is encountered.
-class RedirectCycle(MwClientError):
+class RedirectCycle(WikiError):
+    pass
+
+# Error thrown when the wiki session has expired, and the bot must log in again.
+class LoginExpired(WikiError):
     pass
 
 # Error when reading a template.
 class TemplateError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+# Error thrown when a calculation exceeds its time limit.
+class CalculationTimeout(Exception):
+    pass
+
+# Error thrown when too many calculations are queued up.
+class PoolFull(Exception):
+    pass
@@ -1,3 +1,4 @@
+from config import WIKI_URL
 import src.py.wiki as Wiki
 
 # ID of Wiki Contributor role.
@@ -13,7 +14,7 @@ cd = (
 
 wiki = (
     "Searches for a given article within the "
-    f"[Polytope Wiki]({Wiki.fullURL}). Resolves redirects automatically."
+    f"[Polytope Wiki]({WIKI_URL.rstrip('/')}{Wiki.ARTICLE_PATH}). Resolves redirects automatically."
 )
 
 redirect = (
@@ -26,4 +27,14 @@ search = "Searches for an article on the wiki."
 
 info = "Gets a shape's info from its infobox on the wiki."
 
-space = "Returns the dimension and curvature of a CD."
+space = "Returns the dimension and curvature of a CD, along with its symmetry group if it's finite or affine."
+
+circumradius = (
+    "Returns the circumradius of a CD, with unit edge length. "
+    "Gives a decimal approximation unless `exact` or `digits [n]` are specified."
+)
+
+family = (
+    "Returns the circumradius of every ringing of a CD, with unit edge length. "
+    "The values of its nodes are ignored. Gives decimal approximations unless `exact` is specified."
+)
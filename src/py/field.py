@@ -0,0 +1,559 @@
+from __future__ import annotations
+from fractions import Fraction
+from math import gcd
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import threading
+from mpmath import iv
+from sympy import Expr, Integer, Rational, cos, pi, expand
+
+# Exact arithmetic in the real cyclotomic field Q(2cos(2π/N)).
+# Every entry of a Schläfli matrix, and every node value, is of the form
+# a + 2cos(πα) for rational a and α, and so lives in one of these fields.
+
+Scalar = Union[int, Fraction]
+
+# Multiplies two polynomials, given by their coefficient lists (lowest degree first).
+def multiply(p: List, q: List) -> List:
+    res = [0] * (len(p) + len(q) - 1)
+
+    for i in range(len(p)):
+        if p[i] == 0:
+            continue
+
+        for j in range(len(q)):
+            res[i + j] += p[i] * q[j]
+
+    return res
+
+# Divides a polynomial by a monic polynomial, returning the quotient.
+# The division is assumed to be exact.
+def divide(p: List[int], q: List[int]) -> List[int]:
+    p = list(p)
+    res = [0] * (len(p) - len(q) + 1)
+
+    for i in range(len(res) - 1, -1, -1):
+        res[i] = p[i + len(q) - 1]
+
+        for j in range(len(q)):
+            p[i + j] -= res[i] * q[j]
+
+    return res
+
+# Gets the N-th cyclotomic polynomial, as the product of (x^d - 1)^μ(N/d) over divisors d of N.
+def cyclotomic(order: int) -> List[int]:
+    numerator: List[int] = [1]
+    denominator: List[int] = [1]
+
+    for d in range(1, order + 1):
+        if order % d != 0:
+            continue
+
+        mu = mobius(order // d)
+        if mu == 1:
+            numerator = multiply(numerator, [-1] + [0] * (d - 1) + [1])
+        elif mu == -1:
+            denominator = multiply(denominator, [-1] + [0] * (d - 1) + [1])
+
+    return divide(numerator, denominator)
+
+# The Möbius function.
+def mobius(n: int) -> int:
+    res = 1
+    p = 2
+
+    while p * p <= n:
+        if n % p == 0:
+            n //= p
+            if n % p == 0:
+                return 0
+            res = -res
+        p += 1
+
+    if n > 1:
+        res = -res
+
+    return res
+
+# Gets the polynomials D_k with D_k(x + 1/x) = x^k + 1/x^k, for k up to some degree.
+def dickson(degree: int) -> List[List[int]]:
+    res = [[2], [0, 1]]
+
+    for k in range(2, degree + 1):
+        prev = [0] + res[k - 1]
+        res.append([prev[i] - (res[k - 2][i] if i < len(res[k - 2]) else 0) for i in range(len(prev))])
+
+    return res[:degree + 1]
+
+# Gets the minimal polynomial of 2cos(2π/N), which is monic with integer coefficients.
+def minimalPolynomial(order: int) -> List[int]:
+    if order == 1:
+        return [-2, 1]
+    if order == 2:
+        return [2, 1]
+
+    # The cyclotomic polynomial is palindromic of degree 2d,
+    # so dividing it by x^d leaves a polynomial in x + 1/x.
+    phi = cyclotomic(order)
+    degree = (len(phi) - 1) // 2
+    polys = dickson(degree)
+
+    res = [0] * (degree + 1)
+    res[0] = phi[degree]
+    for k in range(1, degree + 1):
+        for i in range(len(polys[k])):
+            res[i] += phi[degree + k] * polys[k][i]
+
+    return res
+
+# Gets the smallest N such that 2cos(πα) is in Q(2cos(2π/N)).
+def conductor(angle: Fraction) -> int:
+    # 2cos(πα) = 2cos(2π·a/b) for a/b = α/2 in lowest terms.
+    b = (angle / 2).denominator
+
+    # These values are rational.
+    if b in (1, 2, 3, 4, 6):
+        return 1
+
+    # Q(2cos(2π/2b)) = Q(2cos(2π/b)) for odd b.
+    if b % 4 == 2:
+        return b // 2
+
+    return b
+
+# Gets the degree of Q(2cos(2π/N)), which is half of Euler's totient of N, or 1 if N is 1 or 2.
+def degreeOf(order: int) -> int:
+    totient = order
+    n, p = order, 2
+
+    while p * p <= n:
+        if n % p == 0:
+            totient -= totient // p
+            while n % p == 0:
+                n //= p
+        p += 1
+
+    if n > 1:
+        totient -= totient // n
+
+    return max(1, totient // 2)
+
+# The values of 2cos(2πa/b) for a coprime to b, when these are rational.
+rationalCosines: Dict[int, int] = {1: 2, 2: -2, 3: -1, 4: 0, 6: 1}
+
+# Converts a sympy or Python rational to a fraction.
+def toFraction(number) -> Fraction:
+    if isinstance(number, (int, Fraction)):
+        return Fraction(number)
+
+    return Fraction(int(number.p), int(number.q))
+
+# The real cyclotomic field Q(2cos(2π/N)).
+# Its elements are stored as coefficient vectors with respect to powers of c = 2cos(2π/N).
+class Field:
+    __fields: Dict[int, Field] = {}
+    __lock = threading.Lock()
+
+    # Class constructor.
+    def __init__(self, order: int) -> None:
+        self.order = order
+        self.minimal = minimalPolynomial(order)
+        self.degree = len(self.minimal) - 1
+
+        # Cached values of 2cos(2πk/N), for k from 0 to N - 1.
+        self.__cosines: List[Number] = []
+
+        self.zero = Number(self, (Fraction(0),) * self.degree)
+        self.one = self.number(1)
+
+    # Gets the field of a given order. Fields are reused.
+    @staticmethod
+    def of(order: int) -> Field:
+        with Field.__lock:
+            if order not in Field.__fields:
+                Field.__fields[order] = Field(order)
+
+            return Field.__fields[order]
+
+    # Gets the smallest field containing 2cos(πα) for each of the given α.
+    # Returns None if its degree exceeds maxDegree, without building it.
+    @staticmethod
+    def containing(angles: Iterable[Fraction], maxDegree: Optional[int] = None) -> Optional[Field]:
+        order = 1
+        for angle in angles:
+            c = conductor(angle)
+            order = order * c // gcd(order, c)
+
+        if maxDegree is not None and degreeOf(order) > maxDegree:
+            return None
+
+        return Field.of(order)
+
+    # Converts a rational number into an element of the field.
+    def number(self, value: Scalar) -> Number:
+        return Number(self, (Fraction(value),) + (Fraction(0),) * (self.degree - 1))
+
+    # Gets 2cos(πα) as an element of the field.
+    def cos(self, angle: Fraction) -> Number:
+        turn = angle / 2
+        a, b = turn.numerator, turn.denominator
+
+        # These values are rational, and so belong to every field.
+        if b in rationalCosines:
+            return self.number(rationalCosines[b])
+
+        if self.order % b == 0:
+            return self.__cosine(a * (self.order // b))
+
+        # Adds half a turn, which flips the sign of the cosine.
+        turn += Fraction(1, 2)
+        a, b = turn.numerator, turn.denominator
+
+        if self.order % b == 0:
+            return -self.__cosine(a * (self.order // b))
+
+        raise ValueError(f"2cos({angle}π) is not in the field of order {self.order}.")
+
+    # Gets 2cos(2πk/N) as an element of the field, using 2cos(2πk/N) = c·2cos(2π(k-1)/N) - 2cos(2π(k-2)/N).
+    # The list is only published once it's complete, so that other threads never see it half-built.
+    def __cosine(self, k: int) -> Number:
+        if len(self.__cosines) == 0:
+            generator = [Fraction(0)] * (self.degree + 1)
+            generator[1] = Fraction(1)
+            cosines = [self.number(2), Number(self, self.reduce(generator))]
+
+            for i in range(2, self.order):
+                shifted = [Fraction(0)] + list(cosines[i - 1].coeffs)
+                cosines.append(Number(self, self.reduce(shifted)) - cosines[i - 2])
+
+            self.__cosines = cosines
+
+        return self.__cosines[k % self.order]
+
+    # Reduces a polynomial in c modulo the minimal polynomial.
+    def reduce(self, coeffs: List[Fraction]) -> Tuple[Fraction, ...]:
+        coeffs = list(coeffs)
+        d = self.degree
+
+        for i in range(len(coeffs) - 1, d - 1, -1):
+            lead = coeffs[i]
+            if lead != 0:
+                for j in range(d + 1):
+                    coeffs[i - d + j] -= lead * self.minimal[j]
+
+        coeffs += [Fraction(0)] * (d - len(coeffs))
+        return tuple(coeffs[:d])
+
+    # An interval containing c, at the interval context's current precision.
+    def generator(self):
+        return 2 * iv.cos(2 * iv.pi / self.order)
+
+# Guards the precision of mpmath's interval context.
+intervalLock = threading.Lock()
+
+# An element of a real cyclotomic field.
+class Number:
+    # Class constructor.
+    def __init__(self, field: Field, coeffs: Tuple[Fraction, ...]) -> None:
+        self.field = field
+        self.coeffs = coeffs
+
+    # Converts a rational into an element of this number's field.
+    def __coerce(self, other) -> Optional[Number]:
+        if isinstance(other, Number):
+            if other.field is not self.field:
+                raise ValueError("Can't operate on numbers from different fields.")
+            return other
+
+        if isinstance(other, (int, Fraction)):
+            return self.field.number(other)
+
+        return None
+
+    def __add__(self, other) -> Number:
+        other = self.__coerce(other)
+        if other is None:
+            return NotImplemented
+
+        return Number(self.field, tuple(a + b for a, b in zip(self.coeffs, other.coeffs)))
+
+    __radd__ = __add__
+
+    def __neg__(self) -> Number:
+        return Number(self.field, tuple(-a for a in self.coeffs))
+
+    def __sub__(self, other) -> Number:
+        other = self.__coerce(other)
+        if other is None:
+            return NotImplemented
+
+        return Number(self.field, tuple(a - b for a, b in zip(self.coeffs, other.coeffs)))
+
+    def __rsub__(self, other) -> Number:
+        return -self + other
+
+    def __mul__(self, other) -> Number:
+        if isinstance(other, (int, Fraction)):
+            return Number(self.field, tuple(a * other for a in self.coeffs))
+
+        other = self.__coerce(other)
+        if other is None:
+            return NotImplemented
+
+        return Number(self.field, self.field.reduce(multiply(list(self.coeffs), list(other.coeffs))))
+
+    __rmul__ = __mul__
+
+    def __pow__(self, exponent: int) -> Number:
+        res = self.field.one
+        for _ in range(exponent):
+            res *= self
+
+        return res
+
+    def __truediv__(self, other) -> Number:
+        if isinstance(other, (int, Fraction)):
+            return Number(self.field, tuple(a / other for a in self.coeffs))
+
+        other = self.__coerce(other)
+        if other is None:
+            return NotImplemented
+
+        return self * other.inverse()
+
+    def __rtruediv__(self, other) -> Number:
+        return self.inverse() * other
+
+    def __eq__(self, other) -> bool:
+        other = self.__coerce(other)
+        if other is None:
+            return NotImplemented
+
+        return self.coeffs == other.coeffs
+
+    def __hash__(self) -> int:
+        return hash(self.coeffs)
+
+    def __bool__(self) -> bool:
+        return any(self.coeffs)
+
+    def __repr__(self) -> str:
+        return f"Number({self.toSympy()})"
+
+    # Gets the multiplicative inverse, through the extended Euclidean algorithm
+    # on the number and the minimal polynomial.
+    def inverse(self) -> Number:
+        if not self:
+            raise ZeroDivisionError("Division by zero in a cyclotomic field.")
+
+        # Invariant: s·self ≡ r (mod minimal polynomial).
+        r0, r1 = [Fraction(a) for a in self.field.minimal], trim(list(self.coeffs))
+        s0, s1 = [Fraction(0)], [Fraction(1)]
+
+        while len(r1) > 1:
+            quotient, remainder = divmod_(r0, r1)
+            r0, r1 = r1, remainder
+            s0, s1 = s1, trim(subtract(s0, multiply(quotient, s1)))
+
+        # r1 is now a nonzero constant.
+        return Number(self.field, self.field.reduce([a / r1[0] for a in s1]))
+
+    # Gets an interval that's certain to contain the number, computed with a given number of bits of precision.
+    # Powers of c can cancel out, so extra bits are used depending on the size of the terms.
+    def interval(self, prec: int = 53):
+        magnitude = sum(abs(a) * 2 ** i for i, a in enumerate(self.coeffs))
+        guard = int(magnitude).bit_length() + 10
+
+        # The precision is shared by the whole interval context, so no other thread may change it meanwhile.
+        with intervalLock:
+            oldPrec = iv.prec
+            iv.prec = prec + guard
+
+            try:
+                c = self.field.generator()
+                res = iv.mpf(0)
+
+                for a in reversed(self.coeffs):
+                    res = res * c + iv.mpf(a.numerator) / a.denominator
+
+                return res
+            finally:
+                iv.prec = oldPrec
+
+    # Gets the sign of the number: -1, 0 or 1.
+    # The sign is certain as soon as an interval containing the number doesn't contain zero.
+    # Otherwise, zero is tested exactly, and if the number isn't zero, the precision is doubled.
+    def sign(self) -> int:
+        prec = 64
+        while True:
+            value = self.interval(prec)
+
+            if value.a > 0:
+                return 1
+            elif value.b < 0:
+                return -1
+            elif not self:
+                return 0
+
+            prec *= 2
+
+    def __lt__(self, other) -> bool:
+        return (self - other).sign() < 0
+
+    def __gt__(self, other) -> bool:
+        return (self - other).sign() > 0
+
+    # Converts the number into a sympy expression.
+    # Writes it as a combination of 1 and 2cos(2πk/N), which sympy simplifies into radicals when it can.
+    def toSympy(self) -> Expr:
+        coeffs = list(self.coeffs)
+        polys = dickson(self.field.degree - 1)
+        res: Expr = Integer(0)
+
+        # Peels off the highest power of c at a time.
+        for k in range(self.field.degree - 1, 0, -1):
+            lead = coeffs[k]
+
+            if lead != 0:
+                res += Rational(lead.numerator, lead.denominator) * 2 * cos(2 * pi * k / self.field.order)
+
+                for i in range(len(polys[k])):
+                    coeffs[i] -= lead * polys[k][i]
+
+        res += Rational(coeffs[0].numerator, coeffs[0].denominator)
+        return expand(res)
+
+# Removes trailing zero coefficients from a polynomial.
+def trim(p: List[Fraction]) -> List[Fraction]:
+    while len(p) > 1 and p[-1] == 0:
+        p.pop()
+
+    return p
+
+# Subtracts two polynomials.
+def subtract(p: List[Fraction], q: List[Fraction]) -> List[Fraction]:
+    n = max(len(p), len(q))
+    p = p + [Fraction(0)] * (n - len(p))
+    q = q + [Fraction(0)] * (n - len(q))
+
+    return [a - b for a, b in zip(p, q)]
+
+# Divides two polynomials over the rationals, returning the quotient and remainder.
+def divmod_(p: List[Fraction], q: List[Fraction]) -> Tuple[List[Fraction], List[Fraction]]:
+    p = list(p)
+    res = [Fraction(0)] * max(len(p) - len(q) + 1, 1)
+
+    for i in range(len(p) - len(q), -1, -1):
+        res[i] = p[i + len(q) - 1] / q[-1]
+
+        for j in range(len(q)):
+            p[i + j] -= res[i] * q[j]
+
+    return res, trim(p[:len(q) - 1] or [Fraction(0)])
+
+# Solves the linear system matrix·y = vector over a field, by Gaussian elimination.
+# Raises ZeroDivisionError if the matrix is singular.
+def solve(matrix: List[List[Number]], vector: List[Number]) -> List[Number]:
+    return LU(matrix).solve(vector)
+
+# An LU decomposition of a matrix over a field, with row swaps,
+# which solves a linear system for each right-hand side without redoing the elimination.
+class LU:
+    # Class constructor.
+    # Raises ZeroDivisionError if the matrix is singular.
+    def __init__(self, matrix: List[List[Number]]) -> None:
+        n = len(matrix)
+        rows = [list(row) for row in matrix]
+        self.permutation = list(range(n))
+        self.lower: List[List[Number]] = [[] for _ in range(n)]
+
+        for col in range(n):
+            # Any nonzero pivot will do, since arithmetic is exact.
+            pivot = next((row for row in range(col, n) if rows[row][col]), None)
+            if pivot is None:
+                raise ZeroDivisionError("Singular matrix.")
+
+            rows[col], rows[pivot] = rows[pivot], rows[col]
+            self.lower[col], self.lower[pivot] = self.lower[pivot], self.lower[col]
+            self.permutation[col], self.permutation[pivot] = self.permutation[pivot], self.permutation[col]
+            inverse = rows[col][col].inverse()
+
+            for row in range(col + 1, n):
+                factor = rows[row][col] * inverse
+                self.lower[row].append(factor)
+
+                if factor:
+                    for k in range(col, n):
+                        rows[row][k] = rows[row][k] - factor * rows[col][k]
+
+        self.upper = rows
+        self.inverses = [rows[i][i].inverse() for i in range(n)]
+
+    # Solves matrix·y = vector.
+    def solve(self, vector: List[Number]) -> List[Number]:
+        n = len(self.upper)
+        rhs = [vector[i] for i in self.permutation]
+
+        # Forward-substitutes.
+        for row in range(1, n):
+            for k in range(row):
+                if self.lower[row][k]:
+                    rhs[row] = rhs[row] - self.lower[row][k] * rhs[k]
+
+        # Back-substitutes.
+        res: List[Number] = list(rhs)
+        for row in range(n - 1, -1, -1):
+            value = rhs[row]
+            for k in range(row + 1, n):
+                value = value - self.upper[row][k] * res[k]
+
+            res[row] = value * self.inverses[row]
+
+        return res
+
+# A decomposition of a symmetric matrix whose nonzero entries off the diagonal form a tree,
+# which solves a linear system for each right-hand side in linear time.
+# Leaves are eliminated first, which doesn't fill in any entries.
+# On a path, this is just the Thomas algorithm for tridiagonal matrices.
+class TreeLU:
+    # Class constructor. Every index but 0 comes after its parent in order, and entry holds
+    # the matrix entry between each index and its parent.
+    # Raises ValueError if it runs into a zero pivot before the root,
+    # and ZeroDivisionError if the matrix is singular.
+    def __init__(self, diagonal: List[Number], order: List[int], parent: List[int], entry: List[Number]) -> None:
+        self.order = order
+        self.parent = parent
+        self.entry = entry
+
+        pivots = list(diagonal)
+        self.factors: List[Number] = list(entry)
+
+        for i in reversed(order[1:]):
+            if not pivots[i]:
+                raise ValueError("Zero pivot.")
+
+            self.factors[i] = entry[i] / pivots[i]
+            pivots[parent[i]] = pivots[parent[i]] - self.factors[i] * entry[i]
+
+        # The determinant is the product of the pivots.
+        if not pivots[order[0]]:
+            raise ZeroDivisionError("Singular matrix.")
+
+        self.inverses = [pivot.inverse() if pivot else pivot for pivot in pivots]
+
+    # Solves matrix·y = vector.
+    def solve(self, vector: List[Number]) -> List[Number]:
+        order, parent = self.order, self.parent
+        rhs = list(vector)
+
+        for i in reversed(order[1:]):
+            rhs[parent[i]] = rhs[parent[i]] - self.factors[i] * rhs[i]
+
+        # Back-substitutes from the root.
+        res: List[Number] = list(rhs)
+        res[order[0]] = rhs[order[0]] * self.inverses[order[0]]
+
+        for i in order[1:]:
+            res[i] = (rhs[i] - self.entry[i] * res[parent[i]]) * self.inverses[i]
+
+        return res
@@ -0,0 +1,224 @@
+import math
+from collections import deque
+from src.py.node import Node, Graph
+
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+Coords = Tuple[float, float]
+
+# Loops with more nodes than this are drawn in two rows in compact layouts,
+# since the area of a polygon grows quadratically with its number of sides.
+MAX_COMPACT_POLYGON = 8
+
+# Lays out a connected component that isn't a path.
+# Returns the position of every node, with the first node at the origin or the component
+# centered around the x axis, and the drawing mode of its edges.
+# Compact layouts keep the area proportional to the number of nodes.
+def arrange(component: Graph, spacing: float, compact: bool = False) -> Tuple[Dict[Node, Coords], str]:
+    nodes = list(component)
+    edges = sum(node.degree() for node in nodes) // 2
+
+    # Trees.
+    if edges == len(nodes) - 1:
+        return tree(diameterEnd(nodes), spacing, set()), 'tree'
+
+    # Cycles, possibly with trees hanging from them.
+    core = twoCore(nodes)
+    if len(core) >= 3 and all(isCycleNode(node, core) for node in core):
+        if compact and len(core) == len(nodes) and len(nodes) > MAX_COMPACT_POLYGON:
+            return track(ringOf(core), spacing), 'tree'
+
+        return cycle(nodes, core, spacing), 'polygon'
+
+    # Anything else is drawn as a polygon.
+    if compact and len(nodes) > MAX_COMPACT_POLYGON:
+        return track(nodes, spacing), 'tree'
+
+    return polygon(nodes, spacing), 'polygon'
+
+# Places nodes in order around a racetrack: left to right on the top row,
+# and right to left on the bottom one.
+def track(nodes: List[Node], spacing: float) -> Dict[Node, Coords]:
+    top = (len(nodes) + 1) // 2
+    bottom = len(nodes) - top
+    positions: Dict[Node, Coords] = {}
+
+    for i, node in enumerate(nodes[:top]):
+        positions[node] = (i * spacing, 0)
+
+    # The bottom row is spread out to be as wide as the top one.
+    for i, node in enumerate(nodes[top:]):
+        positions[node] = ((top - 1) * spacing * (1 - i / (bottom - 1)), spacing)
+
+    return positions
+
+# Places nodes on a regular polygon, in order, centered at (radius, 0).
+def polygon(nodes: List[Node], spacing: float) -> Dict[Node, Coords]:
+    n = len(nodes)
+    radius = spacing / (2 * math.sin(math.pi / n))
+    positions: Dict[Node, Coords] = {}
+
+    angle = math.pi / 2 + math.pi / n
+    for node in nodes:
+        positions[node] = (radius + radius * math.cos(angle), radius * math.sin(angle))
+        angle += 2 * math.pi / n
+
+    return positions
+
+# Lays out a cycle as a polygon, and each tree hanging from it as a tidy tree pointing outwards.
+def cycle(nodes: List[Node], core: Set[Node], spacing: float) -> Dict[Node, Coords]:
+    ring = ringOf(core)
+    positions = polygon(ring, spacing)
+    radius = spacing / (2 * math.sin(math.pi / len(ring)))
+
+    # Rotates each tail so that it points away from the cycle's center.
+    for node in ring:
+        if node.degree() == 2:
+            continue
+
+        x, y = positions[node]
+        angle = math.atan2(y, x - radius)
+        cos, sin = math.cos(angle), math.sin(angle)
+
+        for tailNode, (tx, ty) in tree(node, spacing, core).items():
+            if tailNode is not node:
+                positions[tailNode] = (x + tx * cos - ty * sin, y + tx * sin + ty * cos)
+
+    return positions
+
+# Walks around a cycle, starting from its first node in string order.
+def ringOf(core: Set[Node]) -> List[Node]:
+    start = min(core, key = lambda node: node.stringIndex)
+    ring = [start]
+    prev, node = start, next(neighbor for neighbor in start.neighbors if neighbor in core)
+
+    while node is not start:
+        ring.append(node)
+        prev, node = node, next(
+            neighbor for neighbor in node.neighbors
+            if neighbor in core and neighbor is not prev
+        )
+
+    return ring
+
+# Whether a node of the core of a graph has exactly two distinct neighbors in it.
+def isCycleNode(node: Node, core: Set[Node]) -> bool:
+    neighbors = [neighbor for neighbor in node.neighbors if neighbor in core]
+    return len(neighbors) == 2 and neighbors[0] is not neighbors[1]
+
+# Gets the nodes that don't belong to any tree hanging from the graph,
+# by repeatedly removing its leaves.
+def twoCore(nodes: List[Node]) -> Set[Node]:
+    degrees = {node: node.degree() for node in nodes}
+    leaves: Deque[Node] = deque(node for node in nodes if degrees[node] <= 1)
+    core = set(nodes)
+
+    while leaves:
+        leaf = leaves.popleft()
+        if leaf not in core:
+            continue
+
+        core.remove(leaf)
+        for neighbor in leaf.neighbors:
+            if neighbor in core:
+                degrees[neighbor] -= 1
+                if degrees[neighbor] == 1:
+                    leaves.append(neighbor)
+
+    return core
+
+# Gets the nodes of a tree in breadth-first order from some root, and the parent of each.
+# Nodes in blocked are never visited, unless they're the root.
+def bfs(root: Node, blocked: Set[Node]) -> Tuple[List[Node], Dict[Node, Optional[Node]]]:
+    order = [root]
+    parents: Dict[Node, Optional[Node]] = {root: None}
+
+    for node in order:
+        for neighbor in node.neighbors:
+            if neighbor not in parents and neighbor not in blocked:
+                parents[neighbor] = node
+                order.append(neighbor)
+
+    return order, parents
+
+# Gets an end of a longest path in a tree, the one that comes first in string order.
+def diameterEnd(nodes: List[Node]) -> Node:
+    order, _ = bfs(min(nodes, key = lambda node: node.stringIndex), set())
+    order, _ = bfs(order[-1], set())
+
+    # Both ends of the path found.
+    end0, end1 = order[0], order[-1]
+    return end0 if end0.stringIndex < end1.stringIndex else end1
+
+# Lays out a tree with a Reingold–Tilford style contour algorithm, with the root at the origin.
+# Nodes in blocked are left out, unless they're the root.
+#
+# The deepest branch of every node continues to its right, so that the longest path from
+# the root is drawn as a straight line, as is usual for Coxeter diagrams. The last other
+# branch hangs straight down, and any in between go diagonally down and to the right.
+# Each branch is then pushed down just enough to clear the branches before it, column by
+# column. As every column of a branch but the deepest one gets compared once, this takes
+# linear time overall.
+def tree(root: Node, spacing: float, blocked: Set[Node]) -> Dict[Node, Coords]:
+    order, parents = bfs(root, blocked)
+
+    # The children of each node, deepest first.
+    children: Dict[Node, List[Node]] = {node: [] for node in order}
+    for node in order[1:]:
+        children[parents[node]].append(node) # type: ignore
+
+    heights: Dict[Node, int] = {}
+    for node in reversed(order):
+        heights[node] = max((heights[child] + 1 for child in children[node]), default = 0)
+        children[node].sort(key = lambda child: (-heights[child], child.stringIndex))
+
+    # The position of each node relative to its parent, in columns and rows.
+    columns: Dict[Node, int] = {root: 0}
+    shifts: Dict[Node, float] = {root: 0}
+
+    # The topmost and bottommost row of each column of each subtree, relative to its root.
+    # They're stored from the rightmost column to the leftmost, so that a column can be added
+    # in front of a contour in constant time.
+    contours: Dict[Node, Tuple[List[float], List[float]]] = {}
+
+    for node in reversed(order):
+        kids = children[node]
+
+        if not kids:
+            contours[node] = ([0], [0])
+            continue
+
+        # Extends the contour of the deepest branch.
+        tops, bottoms = contours.pop(kids[0])
+        tops.append(0)
+        bottoms.append(0)
+        columns[kids[0]] = 1
+        shifts[kids[0]] = 0
+
+        for i, kid in enumerate(kids[1:], 1):
+            kidTops, kidBottoms = contours.pop(kid)
+            column = 0 if i == len(kids) - 1 else 1
+
+            # Finds the least shift that clears every column.
+            shift = max(
+                bottoms[-1 - column - k] - kidTops[-1 - k]
+                for k in range(len(kidTops))
+            ) + spacing
+
+            for k in range(len(kidTops)):
+                j = -1 - column - k
+                tops[j] = min(tops[j], kidTops[-1 - k] + shift)
+                bottoms[j] = max(bottoms[j], kidBottoms[-1 - k] + shift)
+
+            columns[kid] = column
+            shifts[kid] = shift
+
+        contours[node] = (tops, bottoms)
+
+    # Converts relative positions to absolute ones.
+    positions: Dict[Node, Coords] = {root: (0, 0)}
+    for node in order[1:]:
+        x, y = positions[parents[node]] # type: ignore
+        positions[node] = (x + columns[node] * spacing, y + shifts[node])
+
+    return positions
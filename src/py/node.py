@@ -1,61 +1,80 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from fractions import Fraction
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from src.py.exceptions import CDError
-from sympy import Rational, Expr, Matrix, cos, pi, oo, zoo, sqrt, latex
-from sympy.matrices.common import NonInvertibleMatrixError
-
-# Nodes in a CD.
+from src.py.field import Field, Number, LU, TreeLU, toFraction, intervalLock
+from src.py.cache import ResultCache
+import src.py.canonical as Canonical
+import src.py.coxeter as Coxeter
+from sympy import Integer, Rational, Expr, Float, Matrix, Poly, Symbol, N, cos, pi, oo, sqrt, cancel, expand, latex
+
+import math
+import itertools
+import threading
+import mpmath
+import numpy
+from mpmath import iv
+
+# Matrices whose condition number exceeds this are treated as singular in floating point.
+MAX_CONDITION = 1e12
+
+# Number of factorized Schläfli matrices kept around, by topology.
+# A diagram's matrix doesn't depend on its ringing, so only the first of its ringings has to factorize it.
+MAX_FORMULAS = 1024
+formulas = ResultCache(MAX_FORMULAS)
+
+# Guards the precision of mpmath's context.
+precisionLock = threading.Lock()
+
+# Precisions in bits at which signs are tried in interval arithmetic, before deciding them exactly.
+INTERVAL_PRECISIONS = (64, 256)
+
+# Fields of larger degree are too slow to work in, as with diagrams mixing labels like 7, 11 and 13.
+# Exact results then fall back to sympy, and signs to interval arithmetic at FALLBACK_PRECISION bits,
+# taking intervals that still straddle zero as zero.
+MAX_FIELD_DEGREE = 64
+FALLBACK_PRECISION = 1024
+
+# A node in a CD, as a view into the arrays of the graph that contains it.
+# Every node of a graph is a single object, shared with the graph's components.
 class Node:
-    __comp: List[Node]
+    __slots__ = ('graph', 'index')
 
     # Class constructor.
-    def __init__(self, value: str, index: int) -> None:
-        self.stringIndex = index
-
-        if value != 'ß':
-            self.value = value
-        else:
-            self.value = '+'
-
-        self.neighbors: List[Node] = []
-        self.edgeLabels: List[str] = []
-        self.visited: bool = False
-
-        # The index of a node in the graph that contains it.
-        self.arrayIndex: Optional[int] = None
-
-        # The index of a node in the drawing screen.
-        self.drawIndex: Optional[int] = None
-
-        # Auxiliary for graph clone.
-        self.cloneNode: Node
-
-    # Clones a node, along with its neighbors.
-    def clone(self) -> Node:
-        newNode = Node(self.value, self.stringIndex)
-        newNode.neighbors = list(self.neighbors)
-        newNode.edgeLabels = list(self.edgeLabels)
-
-        return newNode
+    def __init__(self, graph: Graph, index: int) -> None:
+        self.graph = graph
+        self.index = index
+
+    # The value of the node.
+    @property
+    def value(self) -> str:
+        return self.graph.values[self.index]
+
+    # The position of the node in the CD's string.
+    @property
+    def stringIndex(self) -> int:
+        return self.graph.positions[self.index]
+
+    # The nodes linked to this one.
+    @property
+    def neighbors(self) -> List[Node]:
+        graph = self.graph
+        return [graph.nodes[j] for j in graph.targets[graph.offsets[self.index]:graph.offsets[self.index + 1]]]
+
+    # The labels of the edges to the nodes linked to this one, in the same order.
+    @property
+    def edgeLabels(self) -> List[str]:
+        graph = self.graph
+        return [graph.labelNames[k] for k in graph.labels[graph.offsets[self.index]:graph.offsets[self.index + 1]]]
 
     # Gets the degree of a node.
     def degree(self) -> int:
-        return len(self.neighbors)
+        return self.graph.offsets[self.index + 1] - self.graph.offsets[self.index]
 
-    # Links two nodes together.
-    def linkTo(self, node: Node, label: str) -> None:
-        if self is node:
-            raise CDError("Can't link node to self.")
-
-        if node in self.neighbors:
-            raise CDError("Can't link two nodes twice.")
-
-        if label != "2":
-            self.neighbors.append(node)
-            self.edgeLabels.append(label)
-            node.neighbors.append(self)
-            node.edgeLabels.append(label)
+    def __repr__(self) -> str:
+        return f"Node({self.value}, {self.index})"
 
     @staticmethod
     def labelToNumber(label: str):
@@ -69,184 +88,639 @@ class Node:
         except TypeError as e:
             raise CDError(f"Edge label {label} could not be recognized as a value.")
 
+    # Gets the angle α such that the Schläfli matrix entry of an edge label is -2cos(πα).
     @staticmethod
-    def nodeToNumber(label: str):
+    def labelToAngle(label: str) -> Fraction:
+        number = Node.labelToNumber(label)
+
+        if number is None:
+            raise CDError("Ø not permitted in circumradius computation.")
+        elif number == oo:
+            return Fraction(0)
+        elif number == 0:
+            raise CDError(f"Edge label {label} could not be recognized as a value.")
+
+        return 1 / toFraction(number)
+
+    # Every node value is of the form a + 2cos(πα).
+    # Gets the pair (a, α), where α is None if there's no cosine term.
+    @staticmethod
+    def nodeToAngle(label: str) -> Tuple[int, Optional[Fraction]]:
         if label in Node.__dictionary:
             return Node.__dictionary[label]
 
         try:
-            return 2 * cos(pi / Rational(label))
+            number = Rational(label)
         except TypeError as e:
             raise CDError(f"Node label {label} could not be recognized as a value.")
 
-    __dictionary = {
-        'o': 0,
-        'x': 1,
-        'q': sqrt(2),
-        'f': (1 + sqrt(5)) / 2,
-        'v': (sqrt(5) - 1) / 2,
-        'h': sqrt(3),
-        'k': sqrt(2 + sqrt(2)),
-        'u': 2,
-        'w': 1 + sqrt(2),
-        'F': (3 + sqrt(5)) / 2
-    }
+        if number == 0:
+            raise CDError(f"Node label {label} could not be recognized as a value.")
 
-    # Gets the connected component of a node.
-    def component(self) -> List[Node]:
-        Node.__comp = []
-        self.__component()
+        return 0, 1 / toFraction(number)
 
-        return Node.__comp
+    # Gets the value of a node label as a sympy expression.
+    @staticmethod
+    def nodeToNumber(label: str) -> Expr:
+        offset, angle = Node.nodeToAngle(label)
+
+        if angle is None:
+            return Integer(offset)
+
+        return offset + 2 * cos(pi * Rational(angle.numerator, angle.denominator))
+
+    # Gets the value of a node label as an element of a field.
+    @staticmethod
+    def nodeToField(label: str, field: Field) -> Number:
+        offset, angle = Node.nodeToAngle(label)
 
-    # Auxiliary function for component.
-    def __component(self) -> None:
-        self.visited = True
-        Node.__comp.append(self)
+        if angle is None:
+            return field.number(offset)
 
-        # Performs DFS.
-        for node in self.neighbors:
-            if not node.visited:
-                node.__component()
+        return field.cos(angle) + offset
 
-# The CD as a graph.
+    __dictionary = {
+        'o': (0, None), # 0
+        'x': (1, None), # 1
+        'q': (0, Fraction(1, 4)), # sqrt(2)
+        'f': (0, Fraction(1, 5)), # (1 + sqrt(5)) / 2
+        'v': (-1, Fraction(1, 5)), # (sqrt(5) - 1) / 2
+        'h': (0, Fraction(1, 6)), # sqrt(3)
+        'k': (0, Fraction(1, 8)), # sqrt(2 + sqrt(2))
+        'u': (2, None), # 2
+        'w': (1, Fraction(1, 4)), # 1 + sqrt(2)
+        'F': (1, Fraction(1, 5)) # (3 + sqrt(5)) / 2
+    }
+
+# The CD as a graph. Graphs are immutable, and are stored as arrays:
+# the value and string position of every node, and the neighbors of every node in compressed sparse row form,
+# with edge labels coded as integers. The components of a graph are views that share its arrays.
 class Graph:
+    __slots__ = ('values', 'positions', 'offsets', 'targets', 'labels', 'labelNames', 'indices', 'nodes')
+
     # Class constructor.
-    def __init__(self, array: List[Node]) -> None:
-        self.array = array
-        self.idx: int
-
-        # If the nodes already have array indices, that is,
-        # if they were already part of a previous graph,
-        # we clone them so as to not run into weird issues.
-        if len(self) > 0:
-            if self[0].arrayIndex is not None:
-                # Associates a clone for every node.
-                for i in range(len(array)):
-                    self[i].cloneNode = self[i].clone()
-
-                # Replaces the original nodes with their clones.
-                for i in range(len(self)):
-                    self[i] = self[i].cloneNode
-                    self[i].arrayIndex = i
-
-                # Links the cloned nodes.
-                for node in self:
-                    for i in range(len(node.neighbors)):
-                        node.neighbors[i] = node.neighbors[i].cloneNode
-            else:
-                for i in range(len(array)):
-                    array[i].arrayIndex = i
+    # The neighbors of node i are targets[offsets[i]:offsets[i + 1]], linked by edges with labels
+    # labelNames[labels[offsets[i]]] and so on. The graph has the nodes in indices, or all of them by default.
+    def __init__(
+        self,
+        values: Tuple[str, ...],
+        positions: Tuple[int, ...],
+        offsets: array,
+        targets: array,
+        labels: array,
+        labelNames: Tuple[str, ...],
+        indices: Optional[Tuple[int, ...]] = None,
+        nodes: Optional[Tuple[Node, ...]] = None
+    ) -> None:
+        # Graphs can't be modified once built.
+        for name, value in (
+            ('values', values),
+            ('positions', positions),
+            ('offsets', offsets),
+            ('targets', targets),
+            ('labels', labels),
+            ('labelNames', labelNames),
+            ('indices', tuple(range(len(values))) if indices is None else indices),
+            ('nodes', tuple(Node(self, i) for i in range(len(values))) if nodes is None else nodes)
+        ):
+            object.__setattr__(self, name, value)
+
+    # Builds a graph from the values and string positions of its nodes,
+    # and its edges as (index, index, label) triples.
+    @staticmethod
+    def fromEdges(values: List[str], positions: List[int], edges: List[Tuple[int, int, str]]) -> Graph:
+        adjacency: List[List[Tuple[int, str]]] = [[] for _ in values]
+        for i, j, label in edges:
+            adjacency[i].append((j, label))
+            adjacency[j].append((i, label))
 
-    # Class iterator.
-    def __iter__(self) -> Graph:
-        self.idx = 0
-        return self
+        labelNames = tuple(sorted(set(label for _, _, label in edges)))
+        codes = {label: k for k, label in enumerate(labelNames)}
 
-    # Next iterator method.
-    def __next__(self) -> Node:
-        if self.idx < len(self):
-            x = self[self.idx]
-            self.idx += 1
-            return x
+        offsets = array('i', [0])
+        targets = array('i')
+        labels = array('i')
 
-        raise StopIteration
+        for neighbors in adjacency:
+            for j, label in neighbors:
+                targets.append(j)
+                labels.append(codes[label])
 
-    def __getitem__(self, key: int) -> Node:
-        return self.array[key]
+            offsets.append(len(targets))
 
-    def __setitem__(self, key: int, value: Node) -> None:
-        self.array[key] = value
+        return Graph(tuple(values), tuple(positions), offsets, targets, labels, labelNames)
 
-    def __delitem__(self, key: int) -> None:
-        del self.array[key]
+    # Gets the graph with only some of the nodes, which share this graph's arrays.
+    def view(self, indices: Tuple[int, ...]) -> Graph:
+        return Graph(
+            self.values, self.positions, self.offsets, self.targets, self.labels, self.labelNames,
+            indices, self.nodes
+        )
 
-    def __len__(self):
-        return len(self.array)
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("Graphs are immutable.")
+
+    # Graphs are pickled as their arrays, and their nodes are rebuilt.
+    def __reduce__(self):
+        return Graph, (self.values, self.positions, self.offsets, self.targets, self.labels, self.labelNames, self.indices)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Graph):
+            return NotImplemented
 
-    # Gets the connected components of a graph.
+        return self.__arrays() == other.__arrays()
+
+    def __hash__(self) -> int:
+        return hash(self.__arrays())
+
+    # Gets everything that defines a graph, in a hashable form.
+    def __arrays(self) -> tuple:
+        return (
+            self.values, self.positions, self.offsets.tobytes(), self.targets.tobytes(),
+            self.labels.tobytes(), self.labelNames, self.indices
+        )
+
+    # Class iterator.
+    def __iter__(self) -> Iterator[Node]:
+        nodes = self.nodes
+        return (nodes[i] for i in self.indices)
+
+    def __getitem__(self, key: int) -> Node:
+        return self.nodes[self.indices[key]]
+
+    def __len__(self):
+        return len(self.indices)
+
+    # Gets a string identifying a graph, with its nodes in order.
+    # Different spellings of the same diagram, like x3o3o3*a and x-3-o-3-o-3-*-c, give the same key.
+    def key(self) -> str:
+        return Canonical.keyOf(list(self))
+
+    # Gets the nodes in canonical order, which is the same for isomorphic diagrams up to their symmetries.
+    def canonicalOrder(self) -> List[Node]:
+        return Canonical.order(list(self))
+
+    # Gets a string identifying a graph up to isomorphism.
+    # Isomorphic diagrams, like x3o3o and o3o3x or x3o3o *b3o and o3o3o *b3x, give the same key.
+    def canonicalKey(self) -> str:
+        return Canonical.keyOf(self.canonicalOrder())
+
+    # Gets a hash of the canonical key of a graph.
+    def canonicalHash(self) -> str:
+        return Canonical.hashOf(list(self))
+
+    # Gets a string identifying the topology of a graph, ignoring its node values,
+    # and the nodes in the order the key refers to them.
+    def topology(self) -> Tuple[str, List[Node]]:
+        order = Canonical.order(list(self), values = False)
+        return Canonical.keyOf(order, values = False), order
+
+    # Gets the connected components of a graph, as views that share its arrays.
+    # The nodes of each component are in depth-first order.
     def components(self) -> List[Graph]:
+        offsets, targets = self.offsets, self.targets
+        visited = bytearray(len(self.values))
         components: List[Graph] = []
 
-        # Puts the connected components in an array.
-        for node in self:
-            if not node.visited:
-                components.append(Graph(node.component()))
+        for start in self.indices:
+            if visited[start]:
+                continue
 
-        # Resets visited attribute.
-        for node in self:
-            node.visited = False
+            # Walks the component, keeping the next edge to try from each node in the stack.
+            visited[start] = True
+            component = [start]
+            stack = [(start, offsets[start])]
+
+            while stack:
+                i, k = stack[-1]
+                if k == offsets[i + 1]:
+                    stack.pop()
+                    continue
+
+                stack[-1] = (i, k + 1)
+                j = targets[k]
+
+                if not visited[j]:
+                    visited[j] = True
+                    component.append(j)
+                    stack.append((j, offsets[j]))
+
+            components.append(self.view(tuple(component)))
 
         return components
 
-    # Gets the Schläfli matrix of a graph.
-    def schlafli(self) -> Matrix:
+    # Gets the smallest field containing the Schläfli matrix of a graph,
+    # and optionally its node values. Returns None if its degree exceeds MAX_FIELD_DEGREE.
+    # Components are best given fields of their own, as the field of a graph contains all of theirs.
+    def field(self, nodeValues: bool = True) -> Optional[Field]:
+        angles: List[Fraction] = []
+
+        for node in self:
+            if nodeValues:
+                angle = Node.nodeToAngle(node.value)[1]
+                if angle is not None:
+                    angles.append(angle)
+
+            for label in node.edgeLabels:
+                angles.append(Node.labelToAngle(label))
+
+        return Field.containing(angles, MAX_FIELD_DEGREE)
+
+    # Gets the Schläfli matrix of a graph, with entries in a given field.
+    # Rows and columns follow the given order of the nodes, or the graph's own.
+    def schlafli(self, field: Field, order: Optional[List[Node]] = None) -> List[List[Number]]:
+        if order is None:
+            order = list(self)
+
         n = len(self)
-        matrix: List[List[Expr]] = []
+        index = {node: i for i, node in enumerate(order)}
+        matrix: List[List[Number]] = []
 
         # For every node in the graph:
         for i in range(n):
-            matrix.append([0] * n)
+            matrix.append([field.zero] * n)
 
-            node = self.array[i]
+            node = order[i]
             neighbors = node.neighbors
             edgeLabels = node.edgeLabels
-            matrix[i][i] = 2
+            matrix[i][i] = field.number(2)
 
             # For every other node in the graph:
             for j in range(len(neighbors)):
-                neighbor = neighbors[j]
-                label = Node.labelToNumber(edgeLabels[j])
-
-                if label is None:
-                    raise CDError("Ø not permitted in circumradius computation.")
-
-                assert isinstance(neighbor.arrayIndex, int)
-
                 # Fills in the matrix entries.
-                matrix[i][neighbor.arrayIndex] = -2 * cos(pi / label)
+                matrix[i][index[neighbors[j]]] = -field.cos(Node.labelToAngle(edgeLabels[j]))
 
-        return Matrix(matrix)
+        return matrix
 
-    # Gets the circumradius of a polytope's CD.
+    # Gets the squared circumradius of a polytope's CD, as an element of a field.
+    # Returns None if the circumradius is infinite.
     # Is meant for a single connected component
     # (but it will work ok for non-connex graphs).
-    def __circumradius(self) -> Expr:               
-        rings = [] 
-        allZero = True
+    def __circumradius(self, field: Field) -> Optional[Number]:
+        key, order = self.topology()
 
         # Creates the vector of distances of the point to the mirrors.
-        for i in range(len(self)):
-            val = Node.nodeToNumber(self.array[i].value)
-            rings.append(val)
-
-            if val != 0:
-                allZero = False
+        rings = [Node.nodeToField(node.value, field) for node in order]
 
         # If all distances are zero, the circumradius is zero.
-        if allZero:
-            return 0
+        if not any(rings):
+            return field.zero
 
-        # Does the actual calculation.
+        factorization = self.__cachedFactorization(field, key, order)
+        if factorization is False:
+            return None
+
+        # Does the actual calculation: the squared circumradius is rings·S⁻¹·rings / 2.
         # Formula found by Wendy Krieger.
-        ringVector = Matrix(rings)
+        stott = factorization.solve(rings)
+        return sum((rings[i] * stott[i] for i in range(len(self))), field.zero) / 2
+
+    # Factorizes the Schläfli matrix of a connected graph with the given topology and order,
+    # unless a diagram with the same topology already did.
+    # Keys are namespaced apart from those of numeric inverses, since a field order can equal a precision.
+    def __cachedFactorization(self, field: Field, key: str, order: List[Node]):
+        key = f"exact:{field.order} {key}"
+        factorization = formulas.get(key)
+
+        if factorization is None:
+            factorization = self.__factorize(field, order)
+            formulas.put(key, factorization)
+
+        return factorization
 
+    # A connected graph is a tree iff it has one less edge than it has nodes.
+    def isTree(self) -> bool:
+        return sum(node.degree() for node in self) == 2 * (len(self) - 1)
+
+    # Factorizes the Schläfli matrix of a connected graph, with its nodes in the given order.
+    # Returns False if the matrix is singular.
+    def __factorize(self, field: Field, order: List[Node]):
         try:
-            stott = self.schlafli() ** -1
-        except NonInvertibleMatrixError:
-            return oo
+            # Trees, which include paths, are factorized in linear time.
+            if self.isTree():
+                try:
+                    return self.__factorizeTree(field, order)
+                except ValueError:
+                    pass
+
+            # Other graphs are factorized by Gaussian elimination.
+            return LU(self.schlafli(field, order))
+        except ZeroDivisionError:
+            return False
+
+    # Factorizes the Schläfli matrix of a tree, with its nodes in the given order,
+    # by eliminating leaves first. See TreeLU.
+    def __factorizeTree(self, field: Field, order: List[Node]) -> TreeLU:
+        n = len(self)
+        index = {node: i for i, node in enumerate(order)}
+
+        # Orders the nodes by BFS, so that every node comes after its parent.
+        bfs: List[int] = [0]
+        parent: List[int] = [0] * n
+        entry: List[Number] = [field.zero] * n # The entry between each node and its parent.
+        visited: List[bool] = [True] + [False] * (n - 1)
+
+        for i in bfs:
+            node = order[i]
+
+            for j in range(len(node.neighbors)):
+                child = index[node.neighbors[j]]
 
-        return sqrt(((stott * ringVector).T * ringVector)[0, 0] / 2)
+                if not visited[child]:
+                    visited[child] = True
+                    parent[child] = i
+                    entry[child] = -field.cos(Node.labelToAngle(node.edgeLabels[j]))
+                    bfs.append(child)
+
+        return TreeLU([field.number(2)] * n, bfs, parent, entry)
 
     # Gets the circumradius of a polytope's CD.
+    # Each component is worked out in its own field, or with sympy if that's too large.
     # Depends on __circumradius.
     def circumradius(self) -> Expr:
-        res = 0
+        res: Expr = Integer(0)
+
         for component in self.components():
-            res += component.__circumradius() ** 2
+            field = component.field()
+
+            if field is None:
+                squared = component.__circumradiusSymbolic()
+            else:
+                number = component.__circumradius(field)
+                squared = None if number is None else number.toSympy()
+
+            if squared is None:
+                return oo
+
+            res += squared
 
         return sqrt(res)
 
+    # Gets the Schläfli matrix of a graph as sympy expressions, along with the angles of its symbols.
+    # Each irrational cosine is replaced by a symbol, so that the entries are integer polynomials,
+    # as expressions in the cosines themselves grow out of hand when solving with them.
+    # Rows and columns follow the given order of the nodes, or the graph's own.
+    def schlafliSymbolic(self, order: Optional[List[Node]] = None) -> Tuple[Matrix, Dict[Symbol, Fraction]]:
+        if order is None:
+            order = list(self)
+
+        n = len(self)
+        index = {node: i for i, node in enumerate(order)}
+        matrix: List[List[Expr]] = [[Integer(0)] * n for _ in range(n)]
+        angles: Dict[Symbol, Fraction] = {}
+
+        for i in range(n):
+            node = order[i]
+            matrix[i][i] = Integer(2)
+
+            for j in range(len(node.neighbors)):
+                angle = Node.labelToAngle(node.edgeLabels[j])
+                value = cos(pi * Rational(angle.numerator, angle.denominator))
+
+                if not value.is_Rational:
+                    value = Symbol(f"c{angle.numerator}_{angle.denominator}")
+                    angles[value] = angle
+
+                matrix[i][index[node.neighbors[j]]] = -2 * value
+
+        return Matrix(matrix), angles
+
+    # Gets the determinant and adjugate of the Schläfli matrix of a connected graph with sympy,
+    # with its nodes in the given order, along with the angles of their symbols.
+    # Returns None if the matrix is singular.
+    def __adjugateSymbolic(self, order: List[Node]) -> Optional[Tuple[Expr, Matrix, Dict[Symbol, Fraction]]]:
+        schlafli, angles = self.schlafliSymbolic(order)
+        det = expand(schlafli.det(method = 'berkowitz'))
+
+        if polynomialSign(det, angles) == 0:
+            return None
+
+        return det, schlafli.adjugate(method = 'berkowitz').applyfunc(expand), angles
+
+    # Gets the squared circumradius of a connected component with sympy, or None if it's infinite.
+    # Only used when the component's field is too large.
+    def __circumradiusSymbolic(self) -> Optional[Expr]:
+        order = list(self)
+        rings = Matrix([Node.nodeToNumber(node.value) for node in order])
+
+        # If all distances are zero, the circumradius is zero.
+        if not any(rings):
+            return Integer(0)
+
+        adjugate = self.__adjugateSymbolic(order)
+        if adjugate is None:
+            return None
+
+        det, adj, angles = adjugate
+        return substituteCosines(cancel(expand((rings.T * adj * rings)[0, 0]) / (2 * det)), angles)
+
+    # Gets the Schläfli matrix of a graph numerically.
+    # Uses floats if digits is None, and mpmath numbers with that many digits otherwise.
+    # Rows and columns follow the given order of the nodes, or the graph's own.
+    def schlafliNumeric(self, digits: Optional[int] = None, order: Optional[List[Node]] = None):
+        if order is None:
+            order = list(self)
+
+        n = len(self)
+        index = {node: i for i, node in enumerate(order)}
+
+        if digits is None:
+            matrix = numpy.zeros((n, n))
+        else:
+            matrix = mpmath.zeros(n, n)
+
+        for i in range(n):
+            node = order[i]
+            matrix[i, i] = 2
+
+            for j in range(len(node.neighbors)):
+                label = Node.labelToNumber(node.edgeLabels[j])
+
+                if label is None:
+                    raise CDError("Ø not permitted in circumradius computation.")
+
+                # Fills in the matrix entries.
+                if digits is None:
+                    entry = -2 * math.cos(math.pi / float(label))
+                elif label == oo:
+                    entry = -2
+                else:
+                    entry = -2 * mpmath.cos(mpmath.pi * int(label.q) / int(label.p))
+
+                matrix[i, index[node.neighbors[j]]] = entry
+
+        return matrix
+
+    # Gets the squared circumradius of a connected component numerically.
+    def __circumradiusNumeric(self, digits: Optional[int]):
+        key, order = self.topology()
+
+        if digits is None:
+            rings = numpy.array([float(Node.nodeToNumber(node.value)) for node in order])
+        else:
+            rings = mpmath.matrix([mpmath.mpf(N(Node.nodeToNumber(node.value), digits)) for node in order])
+
+        # If all distances are zero, the circumradius is zero.
+        if not any(rings):
+            return 0
+
+        cached = self.__cachedInverse(digits, key, order)
+        if cached is False:
+            return math.inf if digits is None else mpmath.inf
+
+        inverse, condition = cached
+
+        if digits is None:
+            squared = float(rings @ inverse @ rings) / 2
+            magnitude = numpy.linalg.norm(inverse, 2) * float(rings @ rings) / 2
+            epsilon = numpy.finfo(float).eps
+        else:
+            squared = (rings.T * inverse * rings)[0] / 2
+            magnitude = mpmath.mnorm(inverse, 1) * (rings.T * rings)[0] / 2
+            epsilon = mpmath.eps
+
+        # Rounding errors can make a zero circumradius come out as a tiny positive or negative number,
+        # whose square root would then be noise, or worse, imaginary. They're bounded by the working
+        # precision, times the condition number, times the size of the quadratic form.
+        if abs(squared) <= len(self) * epsilon * condition * magnitude:
+            return 0
+
+        return squared
+
+    # Inverts the Schläfli matrix of a connected graph with the given topology and order numerically,
+    # unless a diagram with the same topology already did.
+    def __cachedInverse(self, digits: Optional[int], key: str, order: List[Node]):
+        key = f"{'float' if digits is None else f'mp:{digits}'} {key}"
+        inverse = formulas.get(key)
+
+        if inverse is None:
+            inverse = self.__inverseNumeric(digits, order)
+            formulas.put(key, inverse)
+
+        return inverse
+
+    # Inverts the Schläfli matrix of a connected graph numerically, with its nodes in the given order,
+    # and gets its condition number. Returns False if the matrix is singular, up to the working precision.
+    def __inverseNumeric(self, digits: Optional[int], order: List[Node]):
+        schlafli = self.schlafliNumeric(digits, order)
+
+        if digits is None:
+            condition = numpy.linalg.cond(schlafli)
+            if condition > MAX_CONDITION:
+                return False
+
+            return numpy.linalg.inv(schlafli), condition
+
+        # mpmath's own singularity check is fooled by the extra precision it solves with,
+        # so we compare the Schläflian against the working precision instead.
+        if abs(mpmath.det(schlafli)) < 2 ** len(self) * mpmath.mpf(10) ** (5 - digits):
+            return False
+
+        inverse = mpmath.inverse(schlafli)
+        return inverse, mpmath.mnorm(schlafli, 1) * mpmath.mnorm(inverse, 1)
+
+    # Gets a decimal approximation of the circumradius of a polytope's CD,
+    # without computing its exact form.
+    # Uses floats if digits is None, and mpmath with that many digits otherwise.
+    def circumradiusNumeric(self, digits: Optional[int] = None) -> Expr:
+        if digits is None:
+            res = 0
+            for component in self.components():
+                res += component.__circumradiusNumeric(None)
+
+            precision = 15
+        else:
+            # Works with some guard digits.
+            # The precision is shared by the whole mpmath context, so no other thread may change it meanwhile.
+            with precisionLock, mpmath.workdps(digits + 10):
+                res = 0
+                for component in self.components():
+                    res += component.__circumradiusNumeric(digits + 10)
+
+            precision = digits
+
+        if res in (math.inf, mpmath.inf):
+            return oo
+
+        return sqrt(Float(res, precision))
+
+    # Gets the circumradii of every ringing of a diagram, that is, of all 2ⁿ - 1 Wythoffian polytopes
+    # with its symmetry, ignoring its node values. Ringings are tuples of 0s and 1s for the nodes in order,
+    # and come in the order of itertools.product, without the unringed one.
+    #
+    # The Schläfli matrix of each component is inverted only once. As rings are 0 or 1,
+    # the quadratic form rings·S⁻¹·rings / 2 then just adds up the entries between ringed nodes,
+    # which is done for all ringings at once in decimal mode.
+    def family(self, exact: bool = False) -> List[Tuple[Tuple[int, ...], Expr]]:
+        n = len(self)
+        ringings = list(itertools.product((0, 1), repeat = n))[1:]
+        rings = numpy.array(ringings, dtype = float).reshape(len(ringings), n)
+        position = {node: i for i, node in enumerate(self)}
+
+        squared: List[Optional[Expr]] = [Integer(0)] * len(ringings)
+        squaredNumeric = numpy.zeros(len(ringings))
+
+        for component in self.components():
+            key, order = component.topology()
+            columns = [position[node] for node in order]
+            ringed = rings[:, columns].any(axis = 1)
+
+            if not exact:
+                cached = component.__cachedInverse(None, key, order)
+
+                if cached is False:
+                    squaredNumeric[ringed] = math.inf
+                else:
+                    inverse, condition = cached
+                    squaredComponent = numpy.einsum('ij,jk,ik->i', rings[:, columns], inverse, rings[:, columns]) / 2
+                    magnitude = numpy.linalg.norm(inverse, 2) * rings[:, columns].sum(axis = 1) / 2
+
+                    # Squared circumradii within rounding error of zero are zero, as in circumradiusNumeric.
+                    squaredComponent[abs(squaredComponent) <= len(order) * numpy.finfo(float).eps * condition * magnitude] = 0
+                    squaredNumeric += squaredComponent
+
+                continue
+
+            # Each component is worked out in its own field, or with sympy if that's too large.
+            field = component.field(nodeValues = False)
+
+            if field is None:
+                adjugate = component.__adjugateSymbolic(order)
+                inverse = False if adjugate is None else adjugate[1]
+            else:
+                factorization = component.__cachedFactorization(field, key, order)
+                if factorization is False:
+                    inverse = False
+                else:
+                    k = len(order)
+                    inverse = [
+                        factorization.solve([field.one if i == j else field.zero for i in range(k)])
+                        for j in range(k)
+                    ]
+
+            for i, ringing in enumerate(ringings):
+                if not ringed[i] or squared[i] is None:
+                    continue
+
+                if inverse is False:
+                    squared[i] = None
+                    continue
+
+                nodes = [j for j in range(len(order)) if ringing[columns[j]]]
+
+                if field is None:
+                    det, _, angles = adjugate # type: ignore
+                    squared[i] += substituteCosines(cancel(sum((inverse[a, b] for a in nodes for b in nodes), Integer(0)) / (2 * det)), angles)
+                else:
+                    squared[i] += (sum((inverse[a][b] for a in nodes for b in nodes), field.zero) / 2).toSympy()
+
+        if exact:
+            circumradii = [oo if res is None else sqrt(res) for res in squared]
+        else:
+            circumradii = [oo if res == math.inf else sqrt(Float(res, 15)) for res in squaredNumeric]
+
+        return list(zip(ringings, circumradii))
+
     # Same as circumradius, except that it returns a tuple of messages to post.
     def circumradiusFormat(self, mode: str = 'plain') -> Tuple[str, str]:
         circ = self.circumradius()
@@ -269,53 +743,188 @@ class Graph:
         else:
             raise Exception("Invalid format mode.")
 
-    # Gets the rank and curvature of a polytope's CD.
+    # Gets the rank and curvature of a polytope's CD, along with its symmetry group if it's recognized.
     def spaceOf(self) -> str:
-        schlafli = self.schlafli()
+        components = self.components()
+        groups = [Coxeter.recognize(list(component)) for component in components]
+        n = len(self)
+
+        # Finite and affine groups are recognized by their diagrams.
+        if all(group is not None for group in groups):
+            names = [group[0] for group in groups] # type: ignore
+            orders = [group[1] for group in groups] # type: ignore
+
+            if None in orders:
+                return f" is a {n}D Euclidean polytope, with symmetry group {' × '.join(names)} of infinite order."
+
+            return f" is a {n}D spherical polytope, with symmetry group {' × '.join(names)} of order {math.prod(orders)}." # type: ignore
+
+        # The Schläfli matrix is block diagonal, so it's positive definite if all of its blocks are,
+        # and positive semidefinite if all of its blocks are.
+        curvatures = [
+            component.__curvature() if group is None else ("spherical" if group[1] is not None else "Euclidean")
+            for component, group in zip(components, groups)
+        ]
+
+        if "hyperbolic" in curvatures:
+            curv = "hyperbolic"
+        elif "Euclidean" in curvatures:
+            curv = "Euclidean"
+        else:
+            curv = "spherical"
+
+        return f" is a {n}D {curv} polytope."
+
+    # Gets the curvature of a connected component, from its Schläfli matrix.
+    # Signs are decided in interval arithmetic first, at increasing precisions. Only if some interval
+    # still straddles zero, as happens when a sign really is zero, are they decided exactly.
+    def __curvature(self) -> str:
+        field = self.field(nodeValues = False)
+
+        # If the field is too large, intervals that straddle zero at the last precision are taken as zero.
+        precisions = INTERVAL_PRECISIONS if field is not None else INTERVAL_PRECISIONS + (FALLBACK_PRECISION,)
+
+        for prec in precisions:
+            # The precision is shared by the whole interval context, so no other thread may change it meanwhile.
+            with intervalLock:
+                oldPrec = iv.prec
+                iv.prec = prec
+
+                try:
+                    if prec == FALLBACK_PRECISION:
+                        curv = Graph.curvature(self.schlafliInterval(), lambda value: intervalSign(value) or 0)
+                    else:
+                        curv = Graph.curvature(self.schlafliInterval(), intervalSign)
+                finally:
+                    iv.prec = oldPrec
+
+            if curv is not None:
+                return curv
+
+        assert field is not None
+        return Graph.curvature(self.schlafli(field), lambda number: number.sign()) # type: ignore
+
+    # Gets the Schläfli matrix of a graph as intervals, at the interval context's current precision.
+    def schlafliInterval(self) -> List[list]:
         n = len(self)
+        index = {node: i for i, node in enumerate(self)}
+        matrix = [[iv.mpf(0)] * n for _ in range(n)]
+
+        for node in self:
+            i = index[node]
+            matrix[i][i] = iv.mpf(2)
+
+            for j in range(len(node.neighbors)):
+                angle = Node.labelToAngle(node.edgeLabels[j])
+                matrix[i][index[node.neighbors[j]]] = -2 * iv.cos(iv.pi * angle.numerator / angle.denominator)
+
+        return matrix
+
+    # Gets the curvature of a mirror configuration from its Schläfli matrix, given a way to get signs.
+    # Returns None if some sign can't be decided, that is, if sign returns None.
+    #
+    # If a mirror configuration can be built in Euclidean space,
+    # the Schläflian suffices to determine whether it is spherical or Euclidean.
+    # The mirror normals are built by Gram–Schmidt without square roots:
+    # the i-th normal has coordinates lower[i][j]·sqrt(pivots[j]).
+    @staticmethod
+    def curvature(schlafli: List[list], sign: Callable[[Any], Optional[int]]) -> Optional[str]:
+        n = len(schlafli)
+        zero = schlafli[0][0] * 0 if n else 0
 
-        # If a mirror configuration can be built in Euclidean space,
-        # the Schläflian suffices to determine whether it is spherical or Euclidean.
-        valid: bool = True
-        mirrorNormals: List[List[Expr]] = []
+        lower: List[list] = []
+        pivots: list = []
+        signs: List[int] = []
 
         # For each of the mirrors:
         for i in range(n):
-            mirrorNormals.append([0] * n)
-            norm = 0
+            lower.append([zero] * n)
+            norm = zero
 
             # For each of the other mirrors we've already placed:
             for j in range(i):
                 # Calculates their dot product.
-                dot = 0
+                dot = zero
                 for k in range(j):
-                    dot += mirrorNormals[i][k] * mirrorNormals[j][k]
+                    if signs[k]:
+                        dot += lower[i][k] * lower[j][k] * pivots[k]
 
                 # Defines the next coordinate of the i-th mirror so that
                 # the dot product between the i-th and j-th mirror checks out.
-                mirrorNormals[i][j] = (schlafli[i,j] / 2 - dot) / mirrorNormals[j][j]
-                norm += mirrorNormals[i][j] ** 2
-
-            # If the mirror normal can't be built, then the mirror config is hyperbolic.
-            if norm == zoo or norm > 1:
-                valid = False
-                break
-
-            mirrorNormals[i][i] = sqrt(1 - norm)
-
-        if not valid:
-            return f" is a {n}D hyperbolic polytope."
-
-        schlaflian = schlafli.det()
-
-        try:
-            if schlaflian > 0:
-                curv = "spherical"
-            elif schlaflian == 0:
-                curv = "Euclidean"
-            else:
-                raise Exception("The Schläflian of a valid mirror arrangement must be non-negative.")
-        except TypeError as e:
-            raise CDError(f"Couldn't determine sign of Schläflian (≈ {schlaflian.evalf()}). The space of the polytope is probably Euclidean.")
-
-        return f" is a {n}D {curv} polytope."
+                numerator = schlafli[i][j] / 2 - dot
+
+                if signs[j]:
+                    lower[i][j] = numerator / pivots[j]
+                    norm += lower[i][j] * lower[i][j] * pivots[j]
+                # The j-th mirror has no coordinate of its own,
+                # so if the mirror normal can't be built, then the mirror config is hyperbolic.
+                else:
+                    s = sign(numerator)
+                    if s is None:
+                        return None
+                    elif s != 0:
+                        return "hyperbolic"
+
+            pivot = 1 - norm
+            s = sign(pivot)
+            if s is None:
+                return None
+            # The mirror normal would have to be longer than 1.
+            elif s < 0:
+                return "hyperbolic"
+
+            pivots.append(pivot)
+            signs.append(s)
+
+        # The Schläflian is 2^n times the product of the pivots, none of which is negative.
+        return "spherical" if all(signs) else "Euclidean"
+
+# Gets the sign of an interval, or None if it straddles zero.
+def intervalSign(value) -> Optional[int]:
+    if value.a > 0:
+        return 1
+    elif value.b < 0:
+        return -1
+    elif value.a == 0 and value.b == 0:
+        return 0
+
+    return None
+
+# Gets the sign of an integer polynomial in the symbols of schlafliSymbolic, in interval arithmetic
+# at increasing precisions. An interval that still straddles zero at FALLBACK_PRECISION is taken as zero.
+def polynomialSign(poly: Expr, angles: Dict[Symbol, Fraction]) -> int:
+    if not angles or poly.is_Integer:
+        value = int(poly)
+        return (value > 0) - (value < 0)
+
+    symbols = list(angles)
+    terms = Poly(poly, *symbols).terms()
+
+    for prec in INTERVAL_PRECISIONS + (FALLBACK_PRECISION,):
+        # The precision is shared by the whole interval context, so no other thread may change it meanwhile.
+        with intervalLock:
+            oldPrec = iv.prec
+            iv.prec = prec
+
+            try:
+                cosines = [iv.cos(iv.pi * angles[symbol].numerator / angles[symbol].denominator) for symbol in symbols]
+                value = sum(
+                    (int(coeff) * math.prod((cosine ** power for cosine, power in zip(cosines, powers)), start = iv.mpf(1))
+                    for powers, coeff in terms),
+                    iv.mpf(0)
+                )
+            finally:
+                iv.prec = oldPrec
+
+        sign = intervalSign(value)
+        if sign is not None:
+            return sign
+
+    return 0
+
+# Puts the cosines back in place of the symbols of schlafliSymbolic.
+def substituteCosines(expr: Expr, angles: Dict[Symbol, Fraction]) -> Expr:
+    return expr.xreplace({
+        symbol: cos(pi * Rational(angle.numerator, angle.denominator))
+        for symbol, angle in angles.items()
+    })
@@ -0,0 +1,120 @@
+import time
+import queue
+import pickle
+import sqlite3
+import asyncio
+import logging
+import threading
+
+from typing import Any
+
+# Stored results, by canonical diagram and kind of calculation.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    decimal TEXT,
+    seconds REAL NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (key, kind)
+)
+"""
+
+# Results of calculations kept in an SQLite database, so that they survive restarts.
+# Reads run in executor threads, and writes are queued up for a single writer thread,
+# so the event loop never waits on the disk.
+class ResultStore:
+    # Class constructor.
+    # Results computed by a different version of the calculations are ignored.
+    def __init__(self, path: str, version: str) -> None:
+        self.path = path
+        self.version = version
+
+        self.local = threading.local()
+        self.queue: queue.Queue = queue.Queue()
+
+        # Creates the table, and switches to write-ahead logging so that reads don't wait on writes.
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(SCHEMA)
+        conn.close()
+
+        self.writer = threading.Thread(target = self.write, daemon = True)
+        self.writer.start()
+
+    # Opens a connection to the database.
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout = 30)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    # Gets the stored result of a calculation, or None if there's none.
+    async def get(self, key: str, kind: str) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(None, self.read, key, kind)
+
+    # Gets this thread's connection, since they can't be shared between threads.
+    def threadConnection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self.local.conn = conn
+
+        return conn
+
+    # Reads a result from the database. Blocking.
+    def read(self, key: str, kind: str) -> Any:
+        row = self.threadConnection().execute(
+            "SELECT value FROM results WHERE key = ? AND kind = ? AND version = ?",
+            (key, kind, self.version)
+        ).fetchone()
+
+        return None if row is None else pickle.loads(row[0])
+
+    # Queues a result to be stored, along with the number of seconds it took to calculate.
+    # It's pickled and approximated by the writer thread, so that the event loop doesn't wait on either.
+    def put(self, key: str, kind: str, value: Any, seconds: float) -> None:
+        self.queue.put((key, kind, value, seconds, time.time()))
+
+    # Turns a queued result into a row, with its decimal value if it has one. Blocking.
+    def row(self, key: str, kind: str, value: Any, seconds: float, created: float) -> tuple:
+        decimal = str(value.evalf()) if hasattr(value, 'evalf') else None
+        return (key, kind, self.version, pickle.dumps(value), decimal, seconds, created)
+
+    # Main loop of the writer thread: writes queued results, a batch at a time.
+    def write(self) -> None:
+        conn = self.connect()
+
+        while True:
+            results = [self.queue.get()]
+            while not self.queue.empty():
+                results.append(self.queue.get())
+
+            # Losing a result only means calculating it again.
+            # Any error is caught, since the writer thread must outlive a result that can't be stored.
+            rows = []
+            for result in results:
+                try:
+                    rows.append(self.row(*result))
+                except Exception as e:
+                    logging.error(f"Could not store a result: {e}")
+
+            try:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                logging.error(f"Could not store {len(rows)} results: {e}")
+            finally:
+                for _ in results:
+                    self.queue.task_done()
+
+    # Waits for every queued result to be written.
+    def flush(self) -> None:
+        self.queue.join()
+
+    # Counts the stored results of the current version. Blocking.
+    def count(self) -> int:
+        return self.threadConnection().execute(
+            "SELECT COUNT(*) FROM results WHERE version = ?", (self.version,)
+        ).fetchone()[0]
@@ -1,34 +1,206 @@
-from src.py.exceptions import RedirectCycle, TemplateError
-from mwclient import Site
-from mwclient.page import Page
-from mwclient.errors import AssertUserFailedError
+from src.py.exceptions import LoginExpired, RedirectCycle, TemplateError, WikiError
+
+import asyncio
+import aiohttp
 
 import mwparserfromhell
 from mwparserfromhell.wikicode import Wikicode, Tag, Template, Wikilink
 
-from typing import Callable, Dict, List, Tuple, Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Optional, Union
 
-# A wrapper for mwclient.
+# An asynchronous client for the MediaWiki API of the Polytope Wiki.
 username = 'OfficialURL@CoxeterBot'
 userAgent = 'CoxeterBot (eric.ivan.hdz@gmail.com)'
 
-URL = 'polytope.miraheze.org'
-fullURL = "https://polytope.miraheze.org/wiki/"
+# Paths of the API and of the articles, relative to the base URL of the wiki.
+API_PATH = '/w/api.php'
+ARTICLE_PATH = '/wiki/'
+
+# Maximum number of titles the API accepts in a single query.
+MAX_TITLES = 50
+
+# Joins the values of a multi-valued API parameter.
+# Values are usually separated by pipes, but if one contains a pipe, they're separated by the
+# unit separator instead, which the API expects to also start the parameter.
+def joinValues(values: List[str]) -> str:
+    if any('|' in value for value in values):
+        return '\x1f' + '\x1f'.join(values)
+
+    return '|'.join(values)
+
+# A connection to the API of a wiki, through a pool of keep-alive connections.
+# At most a given number of requests are sent at once, and each one times out after some seconds.
+class Site:
+    # Class constructor. Must be called from within the event loop that will use the site.
+    def __init__(self, url: str, connections: int, timeout: float) -> None:
+        self.url = url.rstrip('/')
+
+        # The cookie jar also accepts cookies from IP addresses, so that a local server can stand in for the wiki.
+        self.session = aiohttp.ClientSession(
+            connector = aiohttp.TCPConnector(limit = connections),
+            cookie_jar = aiohttp.CookieJar(unsafe = True),
+            timeout = aiohttp.ClientTimeout(total = timeout),
+            headers = {'User-Agent': userAgent}
+        )
+
+    # Closes every connection.
+    async def close(self) -> None:
+        await self.session.close()
+
+    # Sends a request to the API, and returns its response.
+    # Throws a WikiError if the wiki can't be reached, or if it returns an error.
+    async def request(self, params: Dict[str, str], post: bool = False) -> Dict[str, Any]:
+        params = {**params, 'format': 'json', 'formatversion': '2'}
+
+        try:
+            if post:
+                response = self.session.post(self.url + API_PATH, data = params)
+            else:
+                response = self.session.get(self.url + API_PATH, params = params)
+
+            async with response as r:
+                r.raise_for_status()
+                data = await r.json(content_type = None)
+
+        except asyncio.TimeoutError:
+            raise WikiError("The Polytope Wiki took too long to respond.")
+        except aiohttp.ClientError as e:
+            raise WikiError(f"Could not connect to the Polytope Wiki: {e}")
+
+        if 'error' in data:
+            error = data['error']
+            if error.get('code') == 'assertuserfailed':
+                raise LoginExpired(error.get('info'))
+
+            raise WikiError(error.get('info', error.get('code')))
+
+        return data
+
+    # Sends a query to the API, and gets every item of a list in its response,
+    # following any continuations.
+    async def queryList(self, params: Dict[str, str], name: str) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        continuation: Dict[str, str] = {}
+
+        while True:
+            data = await self.request({**params, **continuation})
+            items.extend(data.get('query', {}).get(name, []))
+
+            if 'continue' not in data:
+                return items
+
+            continuation = data['continue']
+
+    # Logs in with a bot password. The session cookies are kept for every later request.
+    async def login(self, username: str, password: str) -> None:
+        data = await self.request({'action': 'query', 'meta': 'tokens', 'type': 'login'})
+        token = data['query']['tokens']['logintoken']
+
+        data = await self.request(
+            {'action': 'login', 'lgname': username, 'lgpassword': password, 'lgtoken': token}, post = True
+        )
+        result = data['login']
+
+        if result['result'] != 'Success':
+            raise WikiError(f"Could not log into the Polytope Wiki: {result.get('reason', result['result'])}")
+
+    # Gets the pages with the given titles, in as few queries as possible.
+    # Each one is stored both by its title as given and by its name, that is, its normalized title.
+    # Redirects are followed a single step, and the pages they lead to are also stored by their
+    # names, unless they're redirects themselves, as their targets are then unknown.
+    async def pages(self, titles: Iterable[str]) -> Dict[str, 'Page']:
+        titles = list(dict.fromkeys(titles))
+        pages: Dict[str, Page] = {}
+
+        chunks = [titles[i:i + MAX_TITLES] for i in range(0, len(titles), MAX_TITLES)]
+        responses = await asyncio.gather(*(
+            self.request({'action': 'query', 'prop': 'info', 'redirects': '1', 'titles': joinValues(chunk)})
+            for chunk in chunks
+        ))
+
+        for chunk, data in zip(chunks, responses):
+            query = data.get('query', {})
+            normalized = {item['from']: item['to'] for item in query.get('normalized', [])}
+            redirects = {item['from']: item['to'] for item in query.get('redirects', [])}
+            found = {item['title']: item for item in query.get('pages', [])}
+
+            for title in chunk:
+                name = normalized.get(title, title)
+
+                if name in redirects:
+                    pages[title] = Page(self, name, True, redirects[name])
+                else:
+                    item = found.get(name, {'missing': True})
+                    pages[title] = Page(self, name, not (item.get('missing') or item.get('invalid')), None)
+
+                pages[name] = pages[title]
+
+            for name, item in found.items():
+                if name not in pages and not item.get('redirect'):
+                    pages[name] = Page(self, name, not (item.get('missing') or item.get('invalid')), None)
+
+        return pages
+
+    # Replaces the text of a page, as a bot edit.
+    # The wiki refuses the edit if the session has expired, instead of making it logged out.
+    async def edit(self, title: str, text: str) -> None:
+        data = await self.request({'action': 'query', 'meta': 'tokens'})
+        token = data['query']['tokens']['csrftoken']
+
+        data = await self.request({
+            'action': 'edit', 'title': title, 'text': text, 'bot': '1', 'notminor': '1',
+            'assert': 'user', 'token': token
+        }, post = True)
+
+        if data['edit']['result'] != 'Success':
+            raise WikiError(f"Could not edit {title}.")
+
+# A page of a wiki, which might exist or not.
+# If it's a redirect, target is the name of the page it redirects to.
+class Page:
+    # Class constructor.
+    def __init__(self, site: Site, name: str, exists: bool, target: Optional[str]) -> None:
+        self.site = site
+        self.name = name
+        self.exists = exists
+        self.target = target
+
+        self.content: Optional[str] = None
+
+    # Gets the wikitext of the page, which is empty if it doesn't exist.
+    # It's only downloaded the first time.
+    async def text(self) -> str:
+        if self.content is None:
+            data = await self.site.request({
+                'action': 'query', 'prop': 'revisions', 'rvprop': 'content', 'rvslots': 'main', 'titles': self.name
+            })
+            item = data.get('query', {}).get('pages', [{}])[0]
+
+            if 'revisions' in item:
+                self.content = item['revisions'][0]['slots']['main']['content']
+            else:
+                self.content = ''
+
+        return self.content # type: ignore
 
 site: Site
 
-# Does not store the password variable, which may either be good for security, or be stupid.
-def login() -> None:
+# Connects to the wiki at the given base URL, and logs in.
+async def login(url: str, connections: int, timeout: float) -> None:
     global site
-    site = Site(URL, clients_useragent = userAgent)
-    site.login(username, open("src/txt/WIKI_PW.txt", "r").read().rstrip())
+    site = Site(url, connections, timeout)
+    await site.login(username, password())
+
+# Does not store the password variable, which may either be good for security, or be stupid.
+def password() -> str:
+    return open("src/txt/WIKI_PW.txt", "r").read().rstrip()
 
 # Gets all fields from a page's Infobox.
-def getUnparsedFields(page: Page) -> List[Wikicode]:
+async def getUnparsedFields(page: Page) -> List[Wikicode]:
     if not page.exists:
         raise TemplateError(f"The requested page {page.name} does not exist.")
 
-    wikicode = mwparserfromhell.parse(page.text())
+    wikicode = mwparserfromhell.parse(await page.text())
 
     for template in wikicode.filter_templates():
         if template.name.matches("Infobox polytope"):
@@ -36,59 +208,72 @@ def getUnparsedFields(page: Page) -> List[Wikicode]:
 
     raise TemplateError("Infobox polytope not found.")
 
-def getFields(page: Page) -> Dict[str, str]:
-    return parse(getUnparsedFields(page))
+async def getFields(page: Page) -> Dict[str, str]:
+    return await parse(await getUnparsedFields(page))
 
 # Gets a single field from a page's Infobox.
-def getField(page: Page, wikiField: str) -> Tuple[str, str]:
+async def getField(page: Page, wikiField: str) -> Tuple[str, str]:
     if not page.exists:
         raise TemplateError(f"The requested page {page.name} does not exist.")
 
     fieldName = getFieldName(wikiField)
 
     if fieldName is not None:
-        for field in getUnparsedFields(page):
+        for field in await getUnparsedFields(page):
             if getFieldName(field.name) == fieldName:
-                return parseItem(field) # type: ignore
+                return await parseItem(field) # type: ignore
 
     raise TemplateError(f"Field {wikiField} not found.")
 
 # Returns a Page object with a given title.
 # If redirect, goes through the whole redirect chain.
-def page(title: str, redirect: bool = False) -> Page:
-    page = Page(site, title)
+async def page(title: str, redirect: bool = False) -> Page:
+    page = (await site.pages([title]))[title]
     if redirect:
-        page = resolveRedirect(page)
+        page = await resolveRedirect(page)
 
     return page
 
+# Normalizes a title the way MediaWiki does, so that titles of the same page compare equal:
+# underscores are spaces, runs of spaces are collapsed, and the first letter is uppercase.
+def normalize(title: str) -> str:
+    title = ' '.join(title.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
 # Gets the URL of a page.
 def pageToURL(page: Page) -> str:
     return titleToURL(page.name)
 
 # Gets the URL of a page from its title.
 def titleToURL(title: str) -> str:
-    return fullURL + title.translate({32: '_'})
+    return site.url + ARTICLE_PATH + title.translate({32: '_'})
 
 # Searches all articles with a given word in its title.
-def search(key: str):
+async def search(key: str) -> List[Dict[str, Any]]:
     # Sorts by length first, then alphabetically.
     def sortFun(x):
         x = x.get('title')
         return (len(x), x)
 
-    return sorted(site.search(search = key), key = sortFun)
+    results = await site.queryList(
+        {'action': 'query', 'list': 'search', 'srsearch': key, 'srnamespace': '0', 'srlimit': 'max'}, 'search'
+    )
+    return sorted(results, key = sortFun)
 
 # From a page, which might exist or not, goes through the entire redirect chain.
 # Fixes any double redirects it comes across.
 # Throws an exception on a cyclic redirect.
-def resolveRedirect(page: Page) -> Page:
+# Pages already loaded can be passed by name, so that they aren't requested again.
+async def resolveRedirect(page: Page, known: Optional[Dict[str, Page]] = None) -> Page:
     # If the page doesn't exist, returns itself.
     if not page.exists:
         return page
 
     redirectList = [] # Each page in the redirect chain.
     redirectListNames = [] # Each page title in the redirect chain.
+    if known is None:
+        known = {page.name: page}
+
     while page is not None and page.exists:
         if page.name in redirectListNames:
             raise RedirectCycle("Redirect cycle found.")
@@ -96,31 +281,70 @@ def resolveRedirect(page: Page) -> Page:
         redirectList.append(page)
         redirectListNames.append(page.name)
 
-        page = page.redirects_to()
+        if page.target is None:
+            page = None
+        else:
+            # Loading a redirect also loads its target, so this usually takes a request every two steps.
+            if page.target not in known:
+                known.update(await site.pages([page.target]))
+
+            page = known[page.target]
 
     if page is None:
         page = redirectList[-1]
 
     for link in redirectList[:-2]:
-        redirect(link, redirectList[-1])
+        await redirect(link, redirectList[-1])
 
     return page
 
+# Goes through the redirect chains of many pages at once, and gets the page each title leads to.
+# Every chain is followed a step further with each batched query, so that this takes as many
+# queries as the longest chain takes steps, or rather half as many, regardless of the number of titles.
+async def resolveRedirects(titles: Iterable[str]) -> Dict[str, Page]:
+    titles = list(dict.fromkeys(titles))
+    known = await site.pages(titles)
+
+    while True:
+        targets = [
+            page.target for page in known.values()
+            if page.exists and page.target is not None and page.target not in known
+        ]
+        if not targets:
+            break
+
+        known.update(await site.pages(targets))
+
+    return {title: await resolveRedirect(known[title], known) for title in titles}
+
 # Redirects a page to another.
 # Does not perform any checks to see whether the pages exist, etc.
 MAX_TRIES = 3
-def redirect(originPage: Page, targetPage: Page, tries: int = 0) -> None:
+async def redirect(originPage: Page, targetPage: Page, tries: int = 0) -> None:
     try:
-        originPage.edit(f"#REDIRECT [[{targetPage.name}]]", minor = False, bot = True, section = None)
-    except AssertUserFailedError:
-        login()
+        await site.edit(originPage.name, f"#REDIRECT [[{targetPage.name}]]")
+
+        # Keeps the page up to date, so that the redirect isn't fixed twice.
+        originPage.exists = True
+        originPage.target = targetPage.name
+        originPage.content = None
+    except LoginExpired:
+        await site.login(username, password())
 
         if tries < MAX_TRIES:
-            redirect(originPage, targetPage, tries + 1)
+            await redirect(originPage, targetPage, tries + 1)
         else:
             raise ConnectionRefusedError("Could not connect to the Polytope Wiki.")
 
-def parseItem(param: Wikicode) -> Union[Tuple[str, str], Tuple[None, None]]:
+async def parseItem(param: Wikicode) -> Union[Tuple[str, str], Tuple[None, None]]:
+    newName, newCode = translateItem(param)
+    if newName is None:
+        return None, None
+
+    return newName, stringFormat(newCode, await resolveLinks([newCode]))
+
+# Translates the name of a parameter, and cleans up its value, without formatting it yet.
+def translateItem(param: Wikicode) -> Union[Tuple[str, Wikicode], Tuple[None, None]]:
     name: Wikicode = param.name
     code: Wikicode = param.value
 
@@ -134,19 +358,21 @@ def parseItem(param: Wikicode) -> Union[Tuple[str, str], Tuple[None, None]]:
     else:
         newCode = code
 
-    return newName, stringFormat(newCode)
+    return newName, newCode
 
-def parse(params: List[Wikicode]) -> Dict[str, str]:
+async def parse(params: List[Wikicode]) -> Dict[str, str]:
     # A dictionary of parsed parameter names and values.
     parseFieldList: Dict[str, str] = {}
 
-    # For each of the template's parameters:
-    for param in params:
-        newName, newCode = parseItem(param)
+    # Resolves the links of every parameter at once.
+    items = [translateItem(param) for param in params]
+    links = await resolveLinks([newCode for newName, newCode in items if newName is not None])
 
+    # For each of the template's parameters:
+    for newName, newCode in items:
         # Adds the new name and new value to the dictionary.
         if newName is not None and newCode is not None:
-            parseFieldList[newName] = newCode
+            parseFieldList[newName] = stringFormat(newCode, links)
 
     # Adds default values for missing fields.
     return addDefaults(parseFieldList)
@@ -160,9 +386,13 @@ def getFieldName(wikiField: str) -> Optional[str]:
         return fieldTranslator[wikiField]
     return None
 
+# Gets the page every link in some Wikicode objects leads to, by the title in the link.
+async def resolveLinks(codes: List[Wikicode]) -> Dict[str, Page]:
+    return await resolveRedirects(str(link.title) for code in codes for link in code.filter_wikilinks())
+
 # Applies standard formating to turn a Wikicode object into a string.
-# We should remove italics and bold, but preserve links.
-def stringFormat(code: Wikicode) -> str:
+# We should remove italics and bold, but preserve links, whose pages must be resolved beforehand.
+def stringFormat(code: Wikicode, links: Dict[str, Page]) -> str:
     # Parses italics and bold.
     for innerCode in code.filter():
         if isinstance(innerCode, Tag):
@@ -178,7 +408,7 @@ def stringFormat(code: Wikicode) -> str:
                 code.replace(innerCode, '|')
 
         elif isinstance(innerCode, Wikilink):
-            linkPage = page(str(innerCode.title), redirect = True)
+            linkPage = links[str(innerCode.title)]
             link = innerCode.text or innerCode.title
 
             if linkPage.exists:
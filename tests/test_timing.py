@@ -0,0 +1,32 @@
+import time
+import pytest
+from sympy import oo
+
+from src.py import compute as Compute
+
+# Diagrams mixing many different labels, whose common field is huge.
+# Components get fields of their own, or fall back to sympy when even those are too large.
+MIXED = ["x7o11o13o", "x7o11o13o17o", "x7o x11o x13o", "x5o3o3o x7o11o"]
+
+# How long any of these may take, in seconds.
+LIMIT = 5
+
+# Runs a job and checks that it finished in time.
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    assert time.perf_counter() - start < LIMIT
+    return result
+
+@pytest.mark.parametrize("cd", MIXED)
+def testSpace(cd: str):
+    assert timed(Compute.space, cd)
+
+@pytest.mark.parametrize("cd", MIXED)
+def testCircumradius(cd: str):
+    assert timed(Compute.circumradius, cd) != oo
+
+@pytest.mark.parametrize("cd", MIXED[:2])
+def testFamily(cd: str):
+    members = timed(Compute.family, cd, True, 6)
+    assert len(members) == 2 ** len(Compute.parse(cd)) - 1
@@ -0,0 +1,198 @@
+import re
+import asyncio
+import pytest
+
+web = pytest.importorskip("aiohttp.web")
+
+import src.py.wiki as Wiki
+from src.py.exceptions import RedirectCycle, TemplateError, WikiError
+
+# Password the stand-in wiki accepts.
+PASSWORD = "password"
+
+# Pages of the stand-in wiki, by name.
+PAGES = {
+    "Cube": (
+        "{{Infobox polytope\n|dim=3\n|type=''Regular''\n|dual=[[octahedron]]\n"
+        "|army=[[Cube|Cube]], [[Missing page]], [[hexahedron|hex]]\n|conv=yes}}"
+    ),
+    "Octahedron": "No infobox here.",
+    "Hexahedron": "#REDIRECT [[Regular hexahedron]]",
+    "Regular hexahedron": "#REDIRECT [[Cube]]",
+    "Loop a": "#REDIRECT [[Loop b]]",
+    "Loop b": "#REDIRECT [[Loop a]]",
+}
+
+# Number of search results the stand-in wiki returns at once, so that searches need continuations.
+SEARCH_LIMIT = 2
+
+# A stand-in for the MediaWiki API of the Polytope Wiki, with just what the client uses.
+class StandIn:
+    # Class constructor.
+    def __init__(self) -> None:
+        self.pages = dict(PAGES)
+        self.requests: list = []
+        self.edits: list = []
+
+    # Gets the page a page redirects to, if any.
+    def target(self, name: str):
+        match = re.match(r"#REDIRECT \[\[(.*)\]\]", self.pages.get(name, ""))
+        return None if match is None else match.group(1)
+
+    # Gets the entry of a page in a query.
+    def info(self, name: str, revisions: bool) -> dict:
+        if "|" in name:
+            return {"title": name, "invalid": True}
+        if name not in self.pages:
+            return {"title": name, "missing": True}
+
+        item = {"title": name, "pageid": 1, "redirect": self.target(name) is not None}
+        if revisions:
+            item["revisions"] = [{"slots": {"main": {"content": self.pages[name]}}}]
+
+        return item
+
+    # Handles a request to the API.
+    async def api(self, request):
+        params = {**request.query, **await request.post()}
+        self.requests.append(params)
+
+        if params.get("assert") == "user" and "session" not in request.cookies:
+            return web.json_response({"error": {"code": "assertuserfailed", "info": "You are not logged in."}})
+
+        if params.get("meta") == "tokens":
+            return web.json_response({"query": {"tokens": {"logintoken": "login", "csrftoken": "csrf"}}})
+
+        if params.get("action") == "login":
+            success = params["lgpassword"] == PASSWORD
+            response = web.json_response({"login": {"result": "Success" if success else "Failed"}})
+            if success:
+                response.set_cookie("session", "1")
+
+            return response
+
+        if params.get("action") == "edit":
+            self.edits.append((params["title"], params["text"]))
+            self.pages[params["title"]] = params["text"]
+            return web.json_response({"edit": {"result": "Success"}})
+
+        if params.get("list") == "search":
+            hits = [{"title": name} for name in self.pages if params["srsearch"].lower() in name.lower()]
+            offset = int(params.get("sroffset", 0))
+            data: dict = {"query": {"search": hits[offset:offset + SEARCH_LIMIT]}}
+
+            if offset + SEARCH_LIMIT < len(hits):
+                data["continue"] = {"sroffset": str(offset + SEARCH_LIMIT), "continue": "-||"}
+
+            return web.json_response(data)
+
+        titles = params["titles"]
+        titles = titles[1:].split("\x1f") if titles.startswith("\x1f") else titles.split("|")
+        revisions = params.get("prop") == "revisions"
+
+        normalized = [{"from": title, "to": Wiki.normalize(title)} for title in titles if Wiki.normalize(title) != title]
+        redirects = []
+        pages = {}
+
+        for name in map(Wiki.normalize, titles):
+            target = self.target(name)
+
+            if "redirects" in params and target is not None:
+                redirects.append({"from": name, "to": target})
+                pages[target] = self.info(target, revisions)
+            else:
+                pages[name] = self.info(name, revisions)
+
+        return web.json_response({"query": {"pages": list(pages.values()), "normalized": normalized, "redirects": redirects}})
+
+# Runs a test against a stand-in wiki, after logging into it.
+def withWiki(test, password: str = PASSWORD):
+    async def run():
+        standIn = StandIn()
+        app = web.Application()
+        app.router.add_route("*", Wiki.API_PATH, standIn.api)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        server = web.TCPSite(runner, "127.0.0.1", 0)
+        await server.start()
+        host, port = runner.addresses[0][:2]
+
+        oldPassword = Wiki.password
+        Wiki.password = lambda: password
+
+        try:
+            await Wiki.login(f"http://{host}:{port}/", 2, 5)
+            await test(standIn)
+        finally:
+            Wiki.password = oldPassword
+            await Wiki.site.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+def testLogin():
+    async def test(standIn):
+        assert standIn.requests[-1]["action"] == "login"
+        assert Wiki.titleToURL("Cube") == Wiki.site.url + "/wiki/Cube"
+
+    withWiki(test)
+
+def testLoginFailed():
+    async def test(standIn):
+        pass
+
+    with pytest.raises(WikiError):
+        withWiki(test, password = "wrong")
+
+def testRedirectChain():
+    async def test(standIn):
+        page = await Wiki.page("hexahedron")
+        assert (page.name, page.exists, page.target) == ("Hexahedron", True, "Regular hexahedron")
+
+        page = await Wiki.page("hexahedron", redirect = True)
+        assert (page.name, page.exists) == ("Cube", True)
+
+        # The double redirect is fixed on the way.
+        assert standIn.edits == [("Hexahedron", "#REDIRECT [[Cube]]")]
+
+        with pytest.raises(RedirectCycle):
+            await Wiki.page("loop a", redirect = True)
+
+        assert not (await Wiki.page("Nothing", redirect = True)).exists
+
+    withWiki(test)
+
+def testSearch():
+    async def test(standIn):
+        results = await Wiki.search("e")
+        assert [result["title"] for result in results] == ["Cube", "Hexahedron", "Octahedron", "Regular hexahedron"]
+        assert sum(params.get("list") == "search" for params in standIn.requests) == 2
+
+    withWiki(test)
+
+def testGetFields():
+    async def test(standIn):
+        url = Wiki.site.url + "/wiki/"
+        fields = await Wiki.getFields(await Wiki.page("Cube"))
+
+        assert fields["Dimensions"] == "3"
+        assert fields["Type"] == "*Regular*"
+        assert fields["Dual"] == f"[octahedron]({url}Octahedron)"
+        assert fields["Army"] == f"[Cube]({url}Cube), Missing page, [hex]({url}Cube)"
+        assert await Wiki.getField(await Wiki.page("Cube"), "dual") == ("Dual", f"[octahedron]({url}Octahedron)")
+
+        with pytest.raises(TemplateError):
+            await Wiki.getFields(await Wiki.page("Octahedron"))
+
+    withWiki(test)
+
+def testPages():
+    async def test(standIn):
+        pages = await Wiki.site.pages([f"page {i}" for i in range(2 * Wiki.MAX_TITLES)] + ["cube", "a|b"])
+
+        assert pages["cube"] is pages["Cube"] and pages["cube"].exists
+        assert not pages["Page 7"].exists
+        assert not pages["a|b"].exists
+
+    withWiki(test)